@@ -2,12 +2,13 @@ import os
 from datetime import datetime, timedelta
 import logging
 
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from sqlalchemy.orm import DeclarativeBase
 from backend.extensions import db
+from static_assets import StaticAssets
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
@@ -40,6 +41,9 @@ db.init_app(app)
 jwt.init_app(app)
 CORS(app, supports_credentials=True)
 
+# Index the built frontend once at startup
+static_assets = StaticAssets('frontend/dist')
+
 # Import and register blueprints
 with app.app_context():
     from backend.routes.auth import auth_bp
@@ -52,10 +56,7 @@ with app.app_context():
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
     def serve(path):
-        if path != "" and os.path.exists(os.path.join('frontend/dist', path)):
-            return send_from_directory('frontend/dist', path)
-        else:
-            return send_from_directory('frontend/dist', 'index.html')
+        return static_assets.serve(path)
     
     # Import models and create tables
     import backend.models
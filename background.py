@@ -0,0 +1,35 @@
+import logging
+import threading
+
+from database import write_intent
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+def run_periodically(app, name, interval, fn):
+    """Call ``fn()`` every ``interval`` seconds on a daemon thread, inside an app context.
+
+    Every web worker process runs its own thread, so ``fn`` must be safe to
+    run concurrently and repeatedly. Tasks run as writers (see
+    database.write_intent). An ``interval`` of 0 disables the task.
+    """
+    if not interval:
+        logger.info(f"Background task {name} disabled")
+        return None
+
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            with app.app_context(), write_intent():
+                try:
+                    fn()
+                except Exception:
+                    logger.exception(f"Background task {name} failed")
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=loop, name=name, daemon=True)
+    thread.start()
+    return stop
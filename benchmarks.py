@@ -0,0 +1,315 @@
+"""Micro-benchmarks for performance-sensitive paths.
+
+    python benchmarks.py compression [--records N]
+    python benchmarks.py status [--requests N]
+    python benchmarks.py sqlite-load [--workers N] [--seconds S]
+
+The status benchmark runs against DATABASE_URL, or a throwaway SQLite file
+when it is unset. Server-side prepared statements only show up on
+PostgreSQL through psycopg 3 (DATABASE_URL=postgresql+psycopg://...).
+sqlite-load always uses fresh SQLite files.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _timed(fn, repeat):
+    """Best-of-``repeat`` CPU seconds for fn(), and its last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.process_time()
+        result = fn()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def attendance_payload(records):
+    """JSON shaped like /api/admin/attendance for ``records`` rows"""
+    names = [f"Employee {i}" for i in range(200)]
+    locations = ["Hyderabad Office", "Chennai Office", "Mumbai Office", "Delhi Office", "Bangalore Office"]
+    first_day = date.today() - timedelta(days=365)
+    rows = []
+    for i in range(records):
+        user_id = random.randrange(len(names))
+        location_id = random.randrange(len(locations))
+        checkin = datetime.combine(first_day + timedelta(days=i % 365), datetime.min.time()) + timedelta(
+            hours=9, minutes=random.randint(0, 59), seconds=random.randint(0, 59))
+        rows.append({
+            'id': i + 1,
+            'user_id': user_id + 1,
+            'user_name': names[user_id],
+            'day': checkin.date().isoformat(),
+            'checkin_time_stamp': checkin.isoformat(),
+            'checkout_time_stamp': (checkin + timedelta(hours=8, minutes=random.randint(0, 90))).isoformat(),
+            'location_id': location_id + 1,
+            'location_name': locations[location_id],
+            'task': random.choice(["Sprint work", "Code review", "Client meeting", "Testing"]),
+            'task_status': random.choice(["pending", "blockage", "completed"]),
+            'project_name': random.choice(["Apollo", "Gemini", "Mercury"]),
+            'geo_location': None
+        })
+    return json.dumps(rows).encode('utf-8')
+
+
+def bench_compression(args):
+    body = attendance_payload(args.records)
+    print(f"Payload: {args.records} records, {len(body) / 1024:.0f} KiB uncompressed\n")
+
+    candidates = [(f"gzip-{level}", lambda level=level: zlib.compress(body, level)) for level in (1, 6, 9)]
+    if brotli is not None:
+        candidates += [(f"br-{quality}", lambda quality=quality: brotli.compress(body, quality=quality))
+                       for quality in (1, 5, 9)]
+
+    # Streamed responses flush after each chunk; measure the cost of that too
+    def gzip_streamed(chunk_size=64 * 1024, level=6):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        out = [compressor.compress(body[i:i + chunk_size]) + compressor.flush(zlib.Z_SYNC_FLUSH)
+               for i in range(0, len(body), chunk_size)]
+        out.append(compressor.flush())
+        return b''.join(out)
+    candidates.append(("gzip-6 streamed 64K", gzip_streamed))
+
+    print(f"{'codec':<22}{'KiB':>10}{'ratio':>8}{'CPU ms':>10}{'MiB/s':>9}")
+    for name, fn in candidates:
+        seconds, compressed = _timed(fn, args.repeat)
+        print(f"{name:<22}{len(compressed) / 1024:>10.0f}{len(body) / len(compressed):>8.1f}"
+              f"{seconds * 1000:>10.1f}{len(body) / 1048576 / seconds:>9.0f}")
+
+
+def _load_app():
+    """Import the Flask app, pointing it at a scratch database if none is configured"""
+    if not os.environ.get("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="attendance-bench-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("OCCUPANCY_RECONCILE_SECONDS", "0")
+    os.environ.setdefault("AUTO_CHECKOUT_SWEEP_SECONDS", "0")
+    import main as web
+    logging.disable(logging.INFO)
+    return web
+
+
+@contextmanager
+def _statement_timer(engines):
+    """Collect ``(statement, seconds)`` for each cursor.execute on ``engines``"""
+    from sqlalchemy import event
+
+    timings = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('bench_start', []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        timings.append((statement, time.perf_counter() - conn.info['bench_start'].pop()))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before)
+        event.listen(engine, "after_cursor_execute", after)
+    try:
+        yield timings
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before)
+            event.remove(engine, "after_cursor_execute", after)
+
+
+def bench_status(args):
+    web = _load_app()
+    from models import db, User, Location, CheckinCheckout
+
+    email = "bench.status@bench.example"
+    with web.app.app_context():
+        if not User.query.filter_by(email=email).first():
+            user = User(name="Status Bench", email=email)
+            user.set_password("bench")
+            db.session.add(user)
+            db.session.commit()
+
+    client = web.app.test_client()
+    client.post('/api/auth/login', json={"email": email, "password": "bench"})
+    if not client.get('/api/attendance/status').get_json()["isCheckedIn"]:
+        client.post('/api/attendance/checkin', json={})
+
+    # The lookups /api/attendance/status made before the statements in
+    # queries.py: a Query built per request, and the full Location entity
+    def legacy_open_session_status(user_id, day):
+        return CheckinCheckout.query.filter_by(user_id=user_id, day=day, checkout_time_stamp=None).first()
+
+    def legacy_location_name(location_id):
+        location = Location.query.get(location_id)
+        return location.name if location else None
+
+    variants = [
+        ("Query.filter_by", {'open_session_status': legacy_open_session_status,
+                             'location_name': legacy_location_name}),
+        ("precompiled", {'open_session_status': web.open_session_status,
+                         'location_name': web.location_name}),
+    ]
+
+    with web.app.app_context():
+        engines = list(db.engines.values())
+        print(f"Database: {db.engine.url.render_as_string()}, {args.requests} requests per variant\n")
+
+    print(f"{'variant':<18}{'wall ms':>10}{'CPU ms':>10}{'DB ms':>10}{'stmts':>8}")
+    for name, functions in variants:
+        originals = {attr: getattr(web, attr) for attr in functions}
+        for attr, fn in functions.items():
+            setattr(web, attr, fn)
+        try:
+            for _ in range(args.warmup):
+                client.get('/api/attendance/status')
+            with _statement_timer(engines) as timings:
+                wall_start, cpu_start = time.perf_counter(), time.process_time()
+                for _ in range(args.requests):
+                    response = client.get('/api/attendance/status')
+                wall = time.perf_counter() - wall_start
+                cpu = time.process_time() - cpu_start
+        finally:
+            for attr, fn in originals.items():
+                setattr(web, attr, fn)
+        assert response.get_json()["isCheckedIn"], response.get_data()
+        per_request = 1000 / args.requests
+        # SQLite's explicit BEGIN (see database._begin_sqlite) is timed but
+        # not counted as a statement of the request
+        statements = sum(1 for statement, _ in timings if statement.strip().upper() != "BEGIN")
+        print(f"{name:<18}{wall * per_request:>10.3f}{cpu * per_request:>10.3f}"
+              f"{sum(elapsed for _, elapsed in timings) * per_request:>10.3f}{statements / args.requests:>8.1f}")
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def _sqlite_worker(database_url, tuning, emails, start_at, seconds):
+    """Pool task: check users in, read status and check out until time runs out.
+
+    Runs in a fresh (spawned) process per worker, like a gunicorn worker.
+    Returns (latencies in seconds, Counter of errors).
+    """
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SQLITE_TUNING"] = tuning
+    web = _load_app()
+    from sqlalchemy.exc import OperationalError
+
+    web.app.config["PROPAGATE_EXCEPTIONS"] = True
+    clients = []
+    for email in emails:
+        client = web.app.test_client()
+        client.post('/api/auth/login', json={"email": email, "password": "bench"})
+        clients.append(client)
+
+    steps = [
+        ('POST', '/api/attendance/checkin', {"locationId": 1}),
+        ('GET', '/api/attendance/status', None),
+        ('POST', '/api/attendance/checkout', {"task": "Load test", "taskStatus": "completed", "projectName": "Bench"}),
+    ]
+    latencies = []
+    errors = Counter()
+    time.sleep(max(0, start_at - time.time()))
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for client in clients:
+            for method, url, body in steps:
+                started = time.perf_counter()
+                try:
+                    response = client.open(url, method=method, json=body)
+                    if response.status_code >= 400:
+                        errors[f"HTTP {response.status_code}"] += 1
+                except OperationalError as e:
+                    errors["database is locked" if "locked" in str(e) else type(e.orig).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+    return latencies, errors
+
+
+def _sqlite_seed(database_url, tuning, emails):
+    """Pool task: create the schema and the benchmark users"""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SQLITE_TUNING"] = tuning
+    web = _load_app()
+    from werkzeug.security import generate_password_hash
+    from models import db, User
+
+    # A deliberately cheap hash: the benchmark measures the database, not scrypt
+    password_hash = generate_password_hash("bench", method="pbkdf2:sha256:1")
+    with web.app.app_context():
+        db.session.add_all([User(name=email.split('@')[0], email=email, password=password_hash) for email in emails])
+        db.session.commit()
+
+
+def bench_sqlite_load(args):
+    ctx = multiprocessing.get_context("spawn")
+    scratch = tempfile.mkdtemp(prefix="attendance-sqlite-bench-")
+    emails = [f"load{i}@bench.example" for i in range(args.workers * args.users)]
+    print(f"{args.workers} worker processes x {args.users} users, {args.seconds}s per variant "
+          f"(check-in, status, check-out per user)\n")
+    print(f"{'variant':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  errors")
+
+    for tuning in ("off", "on"):
+        database_url = f"sqlite:///{os.path.join(scratch, f'tuning-{tuning}.db')}"
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx) as pool:
+            pool.submit(_sqlite_seed, database_url, tuning, emails).result()
+            start_at = time.time() + args.startup
+            futures = [
+                pool.submit(_sqlite_worker, database_url, tuning,
+                            emails[i * args.users:(i + 1) * args.users], start_at, args.seconds)
+                for i in range(args.workers)
+            ]
+            latencies = []
+            errors = Counter()
+            for future in futures:
+                worker_latencies, worker_errors = future.result()
+                latencies += worker_latencies
+                errors.update(worker_errors)
+
+        latencies.sort()
+        error_text = ', '.join(f"{count} {name}" for name, count in errors.most_common()) or "none"
+        print(f"{tuning:<10}{len(latencies) / args.seconds:>9.0f}"
+              + ''.join(f"{_percentile(latencies, q) * 1000:>9.1f}" for q in (0.5, 0.95, 0.99))
+              + f"{latencies[-1] * 1000:>9.1f}  {error_text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    compression = subparsers.add_parser("compression", help="response compression: bytes saved vs CPU")
+    compression.add_argument("--records", type=int, default=50000)
+    compression.add_argument("--repeat", type=int, default=3)
+    compression.set_defaults(func=bench_compression)
+
+    status = subparsers.add_parser("status", help="/api/attendance/status: per-request CPU and DB time")
+    status.add_argument("--requests", type=int, default=2000)
+    status.add_argument("--warmup", type=int, default=200)
+    status.set_defaults(func=bench_status)
+
+    sqlite_load = subparsers.add_parser("sqlite-load", help="concurrent check-ins on SQLite, stock vs tuned")
+    sqlite_load.add_argument("--workers", type=int, default=4)
+    sqlite_load.add_argument("--users", type=int, default=5, help="users per worker")
+    sqlite_load.add_argument("--seconds", type=float, default=10)
+    sqlite_load.add_argument("--startup", type=float, default=5,
+                             help="seconds allowed for workers to import the app before the run starts")
+    sqlite_load.set_defaults(func=bench_sqlite_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
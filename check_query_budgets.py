@@ -0,0 +1,298 @@
+"""Query-count and query-plan regression check for the API routes in main.py.
+
+Run against a disposable database (it is seeded with synthetic attendance
+rows on first use):
+
+    DATABASE_URL=postgresql://localhost/attendance_budget python check_query_budgets.py
+
+Every API route must declare a statement budget in ROUTE_BUDGETS. Each route
+is called once through the Flask test client; the script fails when a route
+issues more SQL statements than its budget, when a route has no budget, or
+when a query on a hot route reads checkin_checkout with a sequential scan.
+"""
+import json
+import os
+import random
+import sys
+import time as time_module
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import event, insert
+
+# Measure the queries behind every request, not the admin report cache
+os.environ.setdefault("REPORT_CACHE_TTL", "0")
+
+from main import app
+from database import write_intent
+from export_jobs import start_monthly_export
+from models import db, User, Location, CheckinCheckout
+from profiling import PROFILE_HEADER
+
+SEED_DOMAIN = "budget.test"
+SEED_USERS = 200
+SEED_DAYS = 250
+SEED_PASSWORD = "budget-password"
+
+# Maximum SQL statements per request, keyed by endpoint name. Writes to
+# attendance, users or locations include the ReportVersion bump.
+ROUTE_BUDGETS = {
+    'register': 4,
+    'login': 2,
+    'logout': 1,
+    'get_current_user': 1,
+    'check_status': 3,
+    'check_in': 7,
+    'check_out': 5,
+    'get_history': 4,
+    'health_check': 0,
+    'get_locations': 1,
+    'get_all_users': 2,
+    'get_user': 2,
+    'delete_user': 6,
+    'import_users_csv': 5,
+    'get_profiles': 1,
+    'download_profile': 1,
+    'get_all_attendance': 5,
+    'get_user_attendance': 6,
+    'export_user_attendance': 4,
+    'export_attendance': 6,
+    'get_attendance_heatmap': 3,
+    'create_monthly_export': 6,
+    'get_export_jobs': 2,
+    'get_export_job': 2,
+    'download_export_job': 2,
+    'get_occupancy': 3,
+    'reconcile_occupancy_counters': 10,
+    'get_shards': 4,
+}
+
+# Routes whose attendance queries must be served from an index
+HOT_ROUTES = {
+    'check_status', 'check_in', 'check_out', 'get_history',
+    'export_user_attendance', 'export_attendance', 'get_all_attendance',
+}
+
+# Endpoints that are not API routes
+IGNORED_ENDPOINTS = {'static', 'serve'}
+
+
+class StatementRecorder:
+    """Collects every statement sent to the database while active.
+
+    Explicit BEGINs (emitted on SQLite, see database.py) are transaction
+    control, not queries, and are not counted.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and not statement.startswith('BEGIN'):
+            self.statements.append((conn.engine, statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        self.active = True
+        return self
+
+    def __exit__(self, *exc):
+        self.active = False
+
+
+def seed():
+    """Insert synthetic users and attendance rows unless already present"""
+    if User.query.filter(User.email.like(f"%@{SEED_DOMAIN}")).count() >= SEED_USERS:
+        return
+
+    print(f"Seeding {SEED_USERS} users x {SEED_DAYS} days of attendance...")
+    template = User(name="Budget User", email=f"template@{SEED_DOMAIN}")
+    template.set_password(SEED_PASSWORD)
+    db.session.execute(insert(User), [
+        {"name": f"Budget User {i}", "email": f"user{i}@{SEED_DOMAIN}", "password": template.password}
+        for i in range(SEED_USERS)
+    ])
+    db.session.commit()
+
+    user_ids = [u.id for u in User.query.filter(User.email.like(f"%@{SEED_DOMAIN}")).all()]
+    location_ids = [loc.id for loc in Location.query.all()]
+    first_day = date.today() - timedelta(days=SEED_DAYS)
+
+    for offset in range(SEED_DAYS):
+        day = first_day + timedelta(days=offset)
+        rows = []
+        for user_id in user_ids:
+            checkin = datetime.combine(day, time(9, random.randint(0, 59)))
+            rows.append({
+                "user_id": user_id,
+                "day": day,
+                "checkin_time_stamp": checkin,
+                "checkout_time_stamp": checkin + timedelta(hours=8),
+                "location_id": random.choice(location_ids),
+                "task": "Seeded task",
+                "task_status": random.choice(["pending", "blockage", "completed"]),
+                "project_name": random.choice(["Apollo", "Gemini", "Mercury"]),
+                "updated_at": checkin + timedelta(hours=8),
+            })
+        db.session.execute(insert(CheckinCheckout), rows)
+        db.session.commit()
+
+    if db.engine.dialect.name == "postgresql":
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+
+
+def explain(engine, statement, parameters):
+    """Return a description of each sequential scan of checkin_checkout in the plan"""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = []
+            nodes = [plan[0]["Plan"]]
+            while nodes:
+                node = nodes.pop()
+                if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") == "checkin_checkout":
+                    scans.append(f"Seq Scan on checkin_checkout (rows={node.get('Plan Rows')})")
+                nodes.extend(node.get("Plans", []))
+            return scans
+
+        if engine.dialect.name == "sqlite":
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            return [row[-1] for row in rows if row[-1].strip() == "SCAN checkin_checkout"]
+
+    return []
+
+
+def login(email, password):
+    client = app.test_client()
+    response = client.post("/api/auth/login", json={"email": email, "password": password})
+    if response.status_code != 200:
+        sys.exit(f"Could not log in as {email}: {response.get_json()}")
+    return client
+
+
+def route_calls(admin, employee, employee_id, spare_id, job_id, profile_id):
+    """(endpoint, client, method, url, body) for every API route; bytes bodies are sent as CSV"""
+    today = date.today()
+    return [
+        ('health_check', employee, 'GET', '/api/health', None),
+        ('get_locations', employee, 'GET', '/api/locations', None),
+        ('register', app.test_client(), 'POST', '/api/auth/register',
+         {"name": "Budget Register", "email": f"register-{datetime.now().timestamp()}@{SEED_DOMAIN}",
+          "password": SEED_PASSWORD}),
+        ('login', app.test_client(), 'POST', '/api/auth/login',
+         {"email": f"user0@{SEED_DOMAIN}", "password": SEED_PASSWORD}),
+        ('get_current_user', employee, 'GET', '/api/auth/user', None),
+        ('check_status', employee, 'GET', '/api/attendance/status', None),
+        ('check_in', employee, 'POST', '/api/attendance/checkin',
+         {"latitude": 17.385, "longitude": 78.4867, "address": "Budget check"}),
+        ('check_out', employee, 'POST', '/api/attendance/checkout',
+         {"task": "Budget check", "taskStatus": "completed", "projectName": "Apollo"}),
+        ('get_history', employee, 'GET', '/api/attendance/history?limit=50', None),
+        ('get_all_users', admin, 'GET', '/api/admin/users', None),
+        ('get_user', admin, 'GET', f'/api/admin/users/{employee_id}', None),
+        ('get_all_attendance', admin, 'GET',
+         f'/api/admin/attendance?start={(today - timedelta(days=7)).isoformat()}&location_id=3&project_name=Apollo', None),
+        ('get_user_attendance', admin, 'GET', f'/api/admin/attendance/{employee_id}', None),
+        ('export_user_attendance', admin, 'GET',
+         f'/api/admin/attendance/export/{employee_id}?year={today.year}&month={today.month}', None),
+        ('export_attendance', admin, 'GET',
+         f'/api/admin/attendance/export?format=ndjson&start={(today - timedelta(days=7)).isoformat()}', None),
+        ('get_attendance_heatmap', admin, 'GET', '/api/admin/attendance/heatmap?zoom=12', None),
+        ('create_monthly_export', admin, 'POST', '/api/admin/exports/monthly', {"year": 2000, "month": 1}),
+        ('get_export_jobs', admin, 'GET', '/api/admin/exports', None),
+        ('get_export_job', admin, 'GET', f'/api/admin/exports/{job_id}', None),
+        ('download_export_job', admin, 'GET', f'/api/admin/exports/{job_id}/download', None),
+        ('get_occupancy', admin, 'GET', '/api/admin/occupancy', None),
+        ('reconcile_occupancy_counters', admin, 'POST', '/api/admin/occupancy/reconcile', None),
+        ('get_shards', admin, 'GET', '/api/admin/shards', None),
+        ('get_profiles', admin, 'GET', '/api/admin/profiles', None),
+        ('download_profile', admin, 'GET', f'/api/admin/profiles/{profile_id}', None),
+        ('import_users_csv', admin, 'POST', '/api/admin/users/import',
+         "name,email,password\n"
+         f"Budget Import,import-{datetime.now().timestamp()}@{SEED_DOMAIN},{SEED_PASSWORD}\n"
+         f"Budget Duplicate,user0@{SEED_DOMAIN},{SEED_PASSWORD}\n".encode()),
+        ('delete_user', admin, 'DELETE', f'/api/admin/users/{spare_id}', None),
+        ('logout', employee, 'POST', '/api/auth/logout', None),
+    ]
+
+
+def main():
+    recorder = StatementRecorder()
+    failures = []
+
+    with app.app_context():
+        seed()
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", recorder)
+
+        employee_id = User.query.filter_by(email=f"user0@{SEED_DOMAIN}").first().id
+        spare = User(name="Budget Spare", email=f"spare-{datetime.now().timestamp()}@{SEED_DOMAIN}")
+        spare.set_password(SEED_PASSWORD)
+        db.session.add(spare)
+        db.session.commit()
+        spare_id = spare.id
+
+        # Month-end export of an empty month, so its status/download routes have a finished job
+        job = start_monthly_export(2000, 1)
+        for _ in range(120):
+            db.session.refresh(job)
+            if job.status in ('completed', 'failed'):
+                break
+            db.session.commit()  # don't hold a read snapshot while the job writes
+            time_module.sleep(0.5)
+        job_id = job.id
+        db.session.commit()
+
+        # Start from a clean slate so check-in/check-out succeed today
+        with write_intent():
+            CheckinCheckout.query.filter_by(user_id=employee_id, day=date.today()).delete()
+            db.session.commit()
+
+    admin = login("admin@senslyze.com", "admin123")
+    employee = login(f"user0@{SEED_DOMAIN}", SEED_PASSWORD)
+    # One profiled request, so the profile routes have something to serve
+    profile_id = admin.get('/api/locations', headers={PROFILE_HEADER: '1'}).headers['X-Profile-Id']
+    calls = route_calls(admin, employee, employee_id, spare_id, job_id, profile_id)
+
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()} - IGNORED_ENDPOINTS
+    for endpoint in sorted(endpoints - set(ROUTE_BUDGETS)):
+        failures.append(f"{endpoint}: no query budget declared")
+    for endpoint in sorted(endpoints - {call[0] for call in calls}):
+        failures.append(f"{endpoint}: not exercised by check_query_budgets.py")
+
+    print(f"{'endpoint':<30}{'status':>7}{'queries':>9}{'budget':>8}")
+    for endpoint, client, method, url, body in calls:
+        with recorder:
+            if isinstance(body, bytes):
+                response = client.open(url, method=method, data=body, content_type='text/csv')
+            else:
+                response = client.open(url, method=method, json=body)
+            response.get_data()  # drain streamed responses
+        statements = recorder.statements
+        budget = ROUTE_BUDGETS.get(endpoint, 0)
+        print(f"{endpoint:<30}{response.status_code:>7}{len(statements):>9}{budget:>8}")
+
+        if response.status_code >= 400:
+            failures.append(f"{endpoint}: returned {response.status_code}")
+        if len(statements) > budget:
+            failures.append(f"{endpoint}: {len(statements)} statements exceeds budget of {budget}")
+
+        if endpoint in HOT_ROUTES:
+            for engine, statement, parameters in statements:
+                if statement.lstrip().upper().startswith("SELECT") and "checkin_checkout" in statement:
+                    for scan in explain(engine, statement, parameters):
+                        failures.append(f"{endpoint}: {scan}\n    {' '.join(statement.split())}")
+
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll routes within query budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; SQLite's busy timeout still applies
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Used when DATABASE_URL is unset: an embedded SQLite file in the Flask
+# instance folder, for offices without a PostgreSQL server
+DEFAULT_DATABASE_URL = "sqlite:///attendance.db"
+
+# Compiled statements kept per engine (SQLAlchemy's default is 500); the app
+# has few distinct statements, but sharded engines each keep their own cache
+STATEMENT_CACHE_SIZE = 1200
+
+# psycopg 3 prepares a statement server-side once a connection has executed
+# it this many times. Only used with a postgresql+psycopg:// DATABASE_URL and
+# the "psycopg" extra installed (uv sync --extra psycopg); postgresql:// URLs
+# go through psycopg2, which never prepares. Set DB_PREPARE_THRESHOLD=none
+# behind a transaction-pooling PgBouncer, which cannot route prepared
+# statements to the connection that prepared them.
+_prepare_threshold = os.getenv("DB_PREPARE_THRESHOLD", "1")
+PREPARE_THRESHOLD = None if _prepare_threshold.lower() == "none" else int(_prepare_threshold)
+
+# SQLite tuning; SQLITE_TUNING=off keeps SQLite's stock behaviour
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "on").lower() != "off"
+# Seconds a writer waits for another process's write transaction to finish
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "15"))
+SQLITE_PRAGMAS = {
+    # Readers never block the writer and the writer never blocks readers
+    'journal_mode': 'WAL',
+    # With WAL, NORMAL only risks the last commits on power loss, never corruption
+    'synchronous': 'NORMAL',
+    'cache_size': -32768,  # KiB, i.e. 32 MiB of page cache per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': int(SQLITE_BUSY_TIMEOUT * 1000),
+}
+
+# Whether transactions begun in this context will write (see write_intent)
+_write_intent = ContextVar('write_intent', default=False)
+
+# Seconds between attempts on another process's writer lock
+WRITER_LOCK_POLL = 0.001
+
+
+def database_url():
+    """DATABASE_URL, or the embedded SQLite database when it is unset"""
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        logger.info(f"DATABASE_URL not set; using embedded SQLite database {DEFAULT_DATABASE_URL}")
+        return DEFAULT_DATABASE_URL
+    return url
+
+
+def engine_options(url):
+    """SQLAlchemy engine options for a database URL"""
+    options = {
+        "query_cache_size": STATEMENT_CACHE_SIZE,
+    }
+    if url and url.startswith("sqlite"):
+        if SQLITE_TUNING:
+            options["connect_args"] = {"timeout": SQLITE_BUSY_TIMEOUT}
+        return options
+
+    options["pool_recycle"] = 300
+    options["pool_pre_ping"] = True
+    # Only psycopg 3 supports server-side prepared statements; psycopg2
+    # (plain "postgresql://") always sends the full statement text
+    if url and url.startswith("postgresql+psycopg://"):
+        options["connect_args"] = {"prepare_threshold": PREPARE_THRESHOLD}
+    return options
+
+
+def bind_options(urls):
+    """SQLALCHEMY_BINDS entries for {"name": "database url"}, with per-URL options"""
+    return {name: {"url": url, **engine_options(url)} for name, url in urls.items()}
+
+
+@contextmanager
+def write_intent():
+    """Mark transactions begun inside the block as writers.
+
+    On SQLite they start with BEGIN IMMEDIATE, taking the database's single
+    write lock up front (waiting up to SQLITE_BUSY_TIMEOUT for it). A
+    transaction that reads first and writes later would otherwise fail with
+    "database is locked" whenever another process committed in between,
+    since SQLite cannot upgrade a stale read snapshot. Other databases
+    ignore this.
+    """
+    token = _write_intent.set(True)
+    try:
+        yield
+    finally:
+        _write_intent.reset(token)
+
+
+def reads_only(view):
+    """Mark a POST/PUT/DELETE view that never writes, so it does not take the write lock"""
+    view.reads_only = True
+    return view
+
+
+def init_write_intent(app):
+    """Treat every request that is not GET/HEAD/OPTIONS as a writer, unless marked reads_only"""
+
+    @app.before_request
+    def mark_write_request():
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return
+        view = app.view_functions.get(request.endpoint)
+        if not getattr(view, 'reads_only', False):
+            g.write_intent_token = _write_intent.set(True)
+
+    @app.teardown_request
+    def clear_write_request(exc):
+        token = g.pop('write_intent_token', None)
+        if token is not None:
+            _write_intent.reset(token)
+
+
+class WriterLock:
+    """Queue for one SQLite database's write lock, shared by threads and processes.
+
+    SQLite makes a blocked writer poll with sleeps of up to 100 ms, so under
+    contention a waiting check-in often sleeps long after the lock was
+    released. Writers instead wait on a thread lock and then an flock on
+    "<database>-writer.lock", handing the lock over almost immediately.
+    Past SQLITE_BUSY_TIMEOUT they fall back to SQLite's own waiting.
+    """
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path + '-writer.lock'
+        self.thread_lock = threading.Lock()
+        self.fd = None
+
+    @classmethod
+    def for_database(cls, path):
+        with cls._locks_guard:
+            if path not in cls._locks:
+                cls._locks[path] = cls(path)
+            return cls._locks[path]
+
+    def acquire(self):
+        deadline = time.monotonic() + SQLITE_BUSY_TIMEOUT
+        if not self.thread_lock.acquire(timeout=SQLITE_BUSY_TIMEOUT):
+            return False
+        try:
+            if self.fd is None:
+                self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            while True:
+                try:
+                    fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return True
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        break
+                    time.sleep(WRITER_LOCK_POLL)
+        except OSError:
+            logger.exception(f"Could not lock {self.path}")
+        self.thread_lock.release()
+        return False
+
+    def release(self):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+
+def _reset_after_fork():
+    # A forked child (e.g. a ProcessPoolExecutor worker) inherits the forking
+    # thread's write intent and the parent's writer locks, possibly held.
+    # Neither is its own: start it as a reader with no locks.
+    _write_intent.set(False)
+    WriterLock._locks = {}
+    WriterLock._locks_guard = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _release_writer_lock(info):
+    lock = info.pop('writer_lock', None)
+    if lock is not None:
+        lock.release()
+
+
+@event.listens_for(Engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    if not SQLITE_TUNING or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    # Let SQLAlchemy emit BEGIN itself (see _begin_sqlite) instead of the
+    # driver's implicit deferred BEGIN before the first write
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+    cursor.close()
+
+
+@event.listens_for(Engine, "begin")
+def _begin_sqlite(conn):
+    if not SQLITE_TUNING or conn.dialect.name != 'sqlite':
+        return
+    if not _write_intent.get():
+        conn.exec_driver_sql("BEGIN")
+        return
+
+    path = conn.engine.url.database
+    if fcntl is not None and path and path != ':memory:' and 'writer_lock' not in conn.info:
+        lock = WriterLock.for_database(os.path.abspath(path))
+        if lock.acquire():
+            conn.info['writer_lock'] = lock
+    try:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    except Exception:
+        _release_writer_lock(conn.info)
+        raise
+
+
+# The writer lock is held until the connection goes back to the pool, which
+# happens after COMMIT/ROLLBACK has run (the engine's commit and rollback
+# events fire before it)
+@event.listens_for(Pool, "checkin")
+def _release_on_checkin(dbapi_connection, connection_record):
+    if connection_record is not None:
+        _release_writer_lock(connection_record.info)
+
+
+@event.listens_for(Pool, "invalidate")
+def _release_on_invalidate(dbapi_connection, connection_record, exception):
+    _release_writer_lock(connection_record.info)
@@ -0,0 +1,199 @@
+import csv
+import logging
+import os
+import re
+import threading
+import time
+import zipfile
+from calendar import monthrange
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import create_engine, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import NullPool
+
+from database import write_intent
+from exports import MONTHLY_CSV_HEADER, monthly_csv_filename, monthly_csv_row
+from models import db, User, Location, ExportJob
+from shard_routing import DEFAULT_SHARD
+from sharding import shard_for_user
+
+logger = logging.getLogger(__name__)
+
+# A running job whose progress has not moved for this long is assumed dead
+# (e.g. the process running it was restarted) and may be claimed again
+JOB_STALE_AFTER = timedelta(minutes=15)
+
+# Seconds between progress commits while a job runs
+PROGRESS_INTERVAL = 1.0
+
+# Engines created inside pool worker processes, one per database URL
+_worker_engines = {}
+
+
+def _worker_engine(url):
+    if url not in _worker_engines:
+        _worker_engines[url] = create_engine(url, poolclass=NullPool)
+    return _worker_engines[url]
+
+
+def write_user_month_csv(database_url, user_id, location_names, year, month, out_path):
+    """Pool task: write one user's monthly timesheet to ``out_path`` atomically"""
+    checkins = db.metadata.tables['checkin_checkout']
+    _, last_day = monthrange(year, month)
+
+    with _worker_engine(database_url).connect() as conn:
+        records = conn.execute(
+            select(checkins).where(
+                checkins.c.user_id == user_id,
+                checkins.c.day >= date(year, month, 1),
+                checkins.c.day <= date(year, month, last_day)
+            ).order_by(checkins.c.day.asc(), checkins.c.checkin_time_stamp.asc())
+        ).all()
+
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(MONTHLY_CSV_HEADER)
+        for record in records:
+            writer.writerow(monthly_csv_row(record, location_names.get(record.location_id)))
+    os.replace(tmp_path, out_path)
+    return user_id
+
+
+def export_dir():
+    return current_app.config.get("EXPORT_DIR", "exports")
+
+
+def _database_url(shard):
+    engine = db.engine if shard == DEFAULT_SHARD else db.engines[shard]
+    return engine.url.render_as_string(hide_password=False)
+
+
+def _claim(job_id):
+    """Atomically mark a job as running; False if another worker already runs it"""
+    now = datetime.now()
+    claimed = ExportJob.query.filter(
+        ExportJob.id == job_id,
+        or_(ExportJob.status != 'running', ExportJob.updated_at < now - JOB_STALE_AFTER)
+    ).update({
+        'status': 'running',
+        'started_at': now,
+        'finished_at': None,
+        'error': None,
+        'completed': 0,
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+def start_monthly_export(year, month, created_by=None, force=False):
+    """Create (or reuse) the export job for a month and run it in the background.
+
+    A completed job is returned as-is unless ``force`` is set; a failed or
+    stale job resumes, skipping per-user files that were already written.
+    """
+    job = ExportJob.query.filter_by(year=year, month=month).first()
+    if job is None:
+        try:
+            job = ExportJob(year=year, month=month, created_by=created_by)
+            db.session.add(job)
+            db.session.commit()
+        except IntegrityError:
+            # Another request created it concurrently
+            db.session.rollback()
+            job = ExportJob.query.filter_by(year=year, month=month).first()
+
+    if job.status == 'completed' and not force and job.file_path and os.path.exists(job.file_path):
+        return job
+
+    if _claim(job.id):
+        app = current_app._get_current_object()
+        threading.Thread(target=_run_job, args=(app, job.id, force), daemon=True).start()
+
+    db.session.refresh(job)
+    return job
+
+
+def _run_job(app, job_id, force):
+    # Not a writer as a whole: on SQLite that would hold the database's write
+    # lock for the whole export. Only the job's own updates take it.
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        try:
+            _generate(job, force)
+        except Exception as e:
+            logger.exception(f"Monthly export job {job_id} failed")
+            db.session.rollback()
+            _update(job, status='failed', error=str(e), finished_at=datetime.now())
+        finally:
+            db.session.remove()
+
+
+def _update(job, **values):
+    """Set and commit ``values`` on the job in a short write transaction"""
+    # End any read transaction first; SQLite cannot upgrade it to a writer
+    # once another process has committed
+    db.session.commit()
+    with write_intent():
+        for name, value in values.items():
+            setattr(job, name, value)
+        db.session.commit()
+
+
+def _generate(job, force):
+    year, month = job.year, job.month
+    period = f"{year}-{month:02d}"
+    out_dir = os.path.join(export_dir(), period)
+    os.makedirs(out_dir, exist_ok=True)
+    if force:
+        for filename in os.listdir(out_dir):
+            os.remove(os.path.join(out_dir, filename))
+
+    # Plain tuples, so nothing is lazily reloaded while the pool runs
+    users = db.session.execute(select(User.id, User.name).order_by(User.id)).all()
+    location_names = {loc.id: loc.name for loc in Location.query.all()}
+
+    tasks = []
+    done = 0
+    filenames = set()
+    for user_id, name in users:
+        safe_name = re.sub(r'[^\w.-]', '_', monthly_csv_filename(name, year, month))
+        out_path = os.path.join(out_dir, f"{user_id}_{safe_name}")
+        filenames.add(os.path.basename(out_path))
+        if os.path.exists(out_path) and not force:
+            done += 1
+            continue
+        tasks.append((_database_url(shard_for_user(user_id)), user_id, out_path))
+    _update(job, total=len(users))
+
+    workers = current_app.config.get("EXPORT_WORKERS") or os.cpu_count() or 1
+    last_commit = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(write_user_month_csv, url, user_id, location_names, year, month, out_path)
+            for url, user_id, out_path in tasks
+        ]
+        for future in as_completed(futures):
+            future.result()
+            done += 1
+            if time.monotonic() - last_commit >= PROGRESS_INTERVAL:
+                _update(job, completed=done)
+                last_commit = time.monotonic()
+
+    # Files left by an earlier run for renamed or deleted users
+    for filename in os.listdir(out_dir):
+        if filename.endswith('.csv') and filename not in filenames:
+            os.remove(os.path.join(out_dir, filename))
+
+    zip_path = os.path.join(export_dir(), f"attendance_{year}_{month:02d}.zip")
+    tmp_path = zip_path + '.tmp'
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename in sorted(filenames):
+            archive.write(os.path.join(out_dir, filename), arcname=f"{period}/{filename}")
+    os.replace(tmp_path, zip_path)
+
+    _update(job, completed=done, file_path=zip_path, status='completed', finished_at=datetime.now())
+    logger.info(f"Monthly export {period} completed: {done} users -> {zip_path}")
@@ -0,0 +1,258 @@
+import csv
+import heapq
+import io
+import itertools
+import json
+import zlib
+from datetime import datetime
+
+from models import db, User, Location, CheckinCheckout
+from shard_routing import record_key, use_shard
+from sharding import shard_for_user, shard_names
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+# Number of attendance rows fetched per query while streaming an export
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    'id', 'key', 'user_id', 'user_name', 'day', 'checkin_time_stamp', 'checkout_time_stamp',
+    'location_id', 'location_name', 'task', 'task_status', 'project_name', 'hours_worked',
+    'auto_closed'
+]
+
+EXPORT_FORMATS = {
+    'csv.gz': {'mimetype': 'application/gzip', 'extension': 'csv.gz'},
+    'ndjson': {'mimetype': 'application/x-ndjson', 'extension': 'ndjson'},
+    'parquet': {'mimetype': 'application/vnd.apache.parquet', 'extension': 'parquet'},
+}
+
+
+def parquet_available():
+    """Whether the optional pyarrow dependency is installed"""
+    return pa is not None
+
+
+def hours_worked(record):
+    """Hours between check-in and check-out, or None for open sessions"""
+    if record.checkin_time_stamp and record.checkout_time_stamp:
+        duration = record.checkout_time_stamp - record.checkin_time_stamp
+        return round(duration.total_seconds() / 3600, 2)
+    return None
+
+
+# Per-user monthly timesheet CSV, as downloaded by admins for payroll
+MONTHLY_CSV_HEADER = ['Date', 'Check-in Time', 'Check-out Time', 'Location',
+                      'Task', 'Task Status', 'Project Name', 'Hours Worked']
+
+
+def monthly_csv_row(record, location_name):
+    """Timesheet row for an attendance record (ORM object or result row)"""
+    hours = hours_worked(record)
+    return [
+        record.day.strftime('%Y-%m-%d') if record.day else "",
+        record.checkin_time_stamp.strftime('%H:%M:%S') if record.checkin_time_stamp else "",
+        record.checkout_time_stamp.strftime('%H:%M:%S') if record.checkout_time_stamp else "",
+        location_name or "",
+        record.task or "",
+        record.task_status or "",
+        record.project_name or "",
+        f"{hours:.2f}" if hours is not None else ""
+    ]
+
+
+def monthly_csv_filename(user_name, year, month):
+    month_name = datetime.strptime(str(month), "%m").strftime("%B")
+    return f"{user_name.replace(' ', '_')}_attendance_{month_name}_{year}.csv"
+
+
+def _iter_shard_batches(shard, start_date, end_date, user_id, batch_size, location_names):
+    """Yield export row batches from one shard using keyset pagination on (day, id).
+
+    Each batch is a short, independent query in its own read transaction,
+    ended before the batch is yielded, so no transaction or cursor is held
+    open while the client downloads it.
+    """
+    last_key = None
+
+    while True:
+        with use_shard(shard):
+            query = CheckinCheckout.query.filter(
+                CheckinCheckout.day >= start_date,
+                CheckinCheckout.day <= end_date
+            )
+            if user_id is not None:
+                query = query.filter(CheckinCheckout.user_id == user_id)
+            if last_key is not None:
+                query = query.filter(
+                    db.tuple_(CheckinCheckout.day, CheckinCheckout.id) > last_key
+                )
+            records = query.order_by(
+                CheckinCheckout.day.asc(),
+                CheckinCheckout.id.asc()
+            ).limit(batch_size).all()
+
+        if not records:
+            return
+
+        user_ids = {record.user_id for record in records}
+        user_names = dict(
+            db.session.query(User.id, User.name).filter(User.id.in_(user_ids)).all()
+        )
+
+        batch = [{
+            'id': record.id,
+            'key': record_key(record.id, shard),
+            'user_id': record.user_id,
+            'user_name': user_names.get(record.user_id),
+            'day': record.day.isoformat() if record.day else None,
+            'checkin_time_stamp': record.checkin_time_stamp.isoformat() if record.checkin_time_stamp else None,
+            'checkout_time_stamp': record.checkout_time_stamp.isoformat() if record.checkout_time_stamp else None,
+            'location_id': record.location_id,
+            'location_name': location_names.get(record.location_id),
+            'task': record.task,
+            'task_status': record.task_status,
+            'project_name': record.project_name,
+            'hours_worked': hours_worked(record),
+            'auto_closed': record.auto_closed
+        } for record in records]
+
+        last_key = (records[-1].day, records[-1].id)
+        # Detach the batch so the session does not grow with the export (and
+        # so rows from another shard with the same ids are loaded fresh), and
+        # end the read transaction before the client downloads the batch
+        db.session.expunge_all()
+        db.session.rollback()
+        yield batch
+        if len(records) < batch_size:
+            return
+
+
+def iter_export_batches(start_date, end_date, user_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of export rows (dicts) ordered by day across all shards"""
+    location_names = {loc.id: loc.name for loc in Location.query.all()}
+
+    if user_id is not None:
+        shards = [shard_for_user(user_id)]
+    else:
+        shards = shard_names()
+
+    streams = [
+        _iter_shard_batches(shard, start_date, end_date, user_id, batch_size, location_names)
+        for shard in shards
+    ]
+    if len(streams) == 1:
+        yield from streams[0]
+        return
+
+    # Merge the per-shard streams by day and re-batch
+    rows = heapq.merge(
+        *(itertools.chain.from_iterable(stream) for stream in streams),
+        key=lambda row: row['day']
+    )
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_csv_gzip(batches):
+    """Encode row batches as gzip-compressed CSV, one compressed chunk per batch"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    for rows in batches:
+        for row in rows:
+            writer.writerow(['' if row[col] is None else row[col] for col in EXPORT_COLUMNS])
+        chunk = compressor.compress(buffer.getvalue().encode('utf-8'))
+        buffer.seek(0)
+        buffer.truncate()
+        if chunk:
+            yield chunk
+
+    yield compressor.compress(buffer.getvalue().encode('utf-8')) + compressor.flush()
+
+
+def stream_ndjson(batches):
+    """Encode row batches as newline-delimited JSON"""
+    for rows in batches:
+        yield ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+
+
+class _ChunkSink:
+    """Minimal writable file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_parquet(batches):
+    """Encode row batches as Parquet, writing one row group per batch"""
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('key', pa.string()),
+        ('user_id', pa.int64()),
+        ('user_name', pa.string()),
+        ('day', pa.string()),
+        ('checkin_time_stamp', pa.string()),
+        ('checkout_time_stamp', pa.string()),
+        ('location_id', pa.int64()),
+        ('location_name', pa.string()),
+        ('task', pa.string()),
+        ('task_status', pa.string()),
+        ('project_name', pa.string()),
+        ('hours_worked', pa.float64()),
+        ('auto_closed', pa.bool_()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+
+    for rows in batches:
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(export_format, batches):
+    """Return a byte generator for the requested export format"""
+    if export_format == 'csv.gz':
+        return stream_csv_gzip(batches)
+    if export_format == 'ndjson':
+        return stream_ndjson(batches)
+    if export_format == 'parquet':
+        return stream_parquet(batches)
+    raise ValueError(f"Unsupported export format: {export_format}")
@@ -8,6 +8,7 @@ import { useTheme } from '@/context/ThemeContext'
 
 interface AttendanceRecord {
   id: number
+  key: string
   date: string
   checkInTime: string
   checkOutTime: string
@@ -170,7 +171,7 @@ const Dashboard = () => {
           ) : (
             <div className="space-y-4">
               {recentRecords.map((record) => (
-                <div key={record.id} className={`border border-border rounded-lg p-5 shadow-sm transition-all duration-200 hover:shadow-md ${theme === 'dark' ? 'bg-card/30' : 'bg-card'}`}>
+                <div key={record.key} className={`border border-border rounded-lg p-5 shadow-sm transition-all duration-200 hover:shadow-md ${theme === 'dark' ? 'bg-card/30' : 'bg-card'}`}>
                   {/* Header with date, time, and location */}
                   <div className="flex flex-wrap md:flex-nowrap justify-between items-start gap-3 mb-4">
                     <div>
@@ -31,6 +31,7 @@ interface User {
 
 interface AttendanceRecord {
   id: number
+  key: string
   day: string
   checkin_time_stamp: string | null
   checkout_time_stamp: string | null
@@ -397,7 +398,7 @@ const AdminDashboard = () => {
                           </tr>
                         ) : (
                           userAttendance.map(record => (
-                            <tr key={record.id} className="hover:bg-muted/30">
+                            <tr key={record.key} className="hover:bg-muted/30">
                               <td className="px-4 py-3 text-sm">
                                 {record.day ? formatDate(new Date(record.day)) : 'N/A'}
                               </td>
@@ -469,7 +470,7 @@ const AdminDashboard = () => {
                         </tr>
                       ) : (
                         attendance.map(record => (
-                          <tr key={record.id} className="hover:bg-muted/30">
+                          <tr key={record.key} className="hover:bg-muted/30">
                             <td className="px-4 py-3 text-sm font-medium">{record.user_name || 'N/A'}</td>
                             <td className="px-4 py-3 text-sm">
                               {record.day ? formatDate(new Date(record.day)) : 'N/A'}
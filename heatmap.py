@@ -0,0 +1,53 @@
+from collections import Counter
+
+from sqlalchemy import Integer, cast, func
+
+from models import db, CheckinCheckout
+from sharding import scatter_gather
+
+MIN_ZOOM = 0
+MAX_ZOOM = 20
+
+
+def cell_size(zoom):
+    """Grid cell edge in degrees; halves with every zoom level (~20 km at zoom 10)"""
+    return 180.0 / (2 ** zoom)
+
+
+def _cell_index(column, offset, size):
+    # Offsetting by 90/180 keeps values non-negative, where truncation equals
+    # floor; PostgreSQL rounds on integer casts so it needs floor() explicitly
+    value = (column + offset) / size
+    if db.session.get_bind(mapper=CheckinCheckout).dialect.name == 'postgresql':
+        return func.floor(value)
+    return cast(value, Integer)
+
+
+def _shard_cells(start_date, end_date, size):
+    lat_index = _cell_index(CheckinCheckout.geo_latitude, 90, size).label('lat_cell')
+    lon_index = _cell_index(CheckinCheckout.geo_longitude, 180, size).label('lon_cell')
+    rows = db.session.query(
+        lat_index, lon_index, func.count()
+    ).filter(
+        CheckinCheckout.day >= start_date,
+        CheckinCheckout.day <= end_date,
+        CheckinCheckout.geo_latitude.isnot(None),
+        CheckinCheckout.geo_longitude.isnot(None)
+    ).group_by(lat_index, lon_index).all()
+    return {(int(lat), int(lon)): count for lat, lon, count in rows}
+
+
+def heatmap_cells(start_date, end_date, zoom):
+    """Check-in counts per grid cell, aggregated in the database.
+
+    Returns ``[[lat, lon, count], ...]`` where lat/lon is the cell centre.
+    """
+    size = cell_size(zoom)
+    totals = Counter()
+    for shard_cells in scatter_gather(lambda: _shard_cells(start_date, end_date, size)):
+        totals.update(shard_cells)
+
+    return [
+        [round((lat + 0.5) * size - 90, 6), round((lon + 0.5) * size - 180, 6), count]
+        for (lat, lon), count in sorted(totals.items())
+    ]
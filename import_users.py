@@ -0,0 +1,26 @@
+import sys
+
+from database import write_intent
+from main import app
+from onboarding import import_users, read_user_csv
+
+USAGE = """Usage:
+    python import_users.py <users.csv>
+
+The CSV needs name, email and password columns; is_admin is optional.
+"""
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(USAGE)
+        sys.exit(1)
+
+    with app.app_context(), write_intent(), open(sys.argv[1], 'rb') as f:
+        result = import_users(read_user_csv(f), workers=app.config["IMPORT_WORKERS"])
+
+    for error in result['errors']:
+        print(f"line {error['line']}: {error['email'] or '-'}: {error['error']}")
+    print(f"Created {result['created']} users, rejected {len(result['errors'])} rows.")
+    if 'error' in result:
+        print(f"Stopped early: {result['error']}")
+    sys.exit(1 if result['errors'] or 'error' in result else 0)
@@ -1,18 +1,38 @@
 import os
-from flask import Flask, send_from_directory, jsonify, request, session, Response
+from flask import Flask, jsonify, request, session, Response, stream_with_context, g, send_file
 from flask_cors import CORS
 from datetime import datetime, date
 import logging
 import csv
 import io
+import itertools
 from calendar import monthrange
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import json
+import base64
+from sqlalchemy.orm import selectinload
 from dotenv import load_dotenv
 load_dotenv()
 # Import database models
-from models import db, User, Location, CheckinCheckout, GeoLocation
+from database import bind_options, database_url, engine_options, init_write_intent, reads_only, write_intent
+from models import db, User, Location, CheckinCheckout, ShardAssignment, ExportJob
+from exports import (EXPORT_FORMATS, MONTHLY_CSV_HEADER, iter_export_batches, monthly_csv_filename,
+                     monthly_csv_row, parquet_available, stream_export)
+from profiling import PROFILE_HEADER, init_profiling, list_profiles, profile_path
+from report_cache import ensure_report_version, init_report_cache, report_cache, report_key
+from static_assets import StaticAssets
+from compression import init_compression
+from heatmap import MAX_ZOOM, MIN_ZOOM, cell_size, heatmap_cells
+from export_jobs import start_monthly_export
+from onboarding import import_users, read_user_csv
+from queries import location_name, open_session, open_session_status
+from occupancy import occupancy_snapshot, reconcile_occupancy, record_checkin, record_checkout
+from background import run_periodically
+from sweeper import parse_cutoff, sweep_stale_sessions
+from shard_routing import DEFAULT_SHARD, activate_shard, current_shard, deactivate_shard, record_key
+from sharding import (ShardUnavailable, create_shard_tables, merge_sorted, scatter_gather,
+                      shard_for_user, shard_names, sharding_enabled, user_shard)
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -21,23 +41,74 @@ app = Flask(__name__)
 
 # App configuration 
 app.secret_key = os.getenv("SESSION_SECRET", "senslyze_secret_key")
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL")
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url()
 # app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Extra attendance shards as a JSON object of {"name": "database url"};
+# the primary database is always the "default" shard
+shard_urls = json.loads(os.getenv("SHARD_DATABASE_URLS", "{}"))
+app.config["SQLALCHEMY_BINDS"] = bind_options(shard_urls)
+app.config["ATTENDANCE_SHARDS"] = [DEFAULT_SHARD, *shard_urls]
+
+# Month-end bulk exports are written here by a pool of worker processes
+app.config["EXPORT_DIR"] = os.path.abspath(os.getenv("EXPORT_DIR", "exports"))
+app.config["EXPORT_WORKERS"] = int(os.getenv("EXPORT_WORKERS", "0")) or None
+
+# Processes hashing passwords in import_users.py (default: one per CPU)
+app.config["IMPORT_WORKERS"] = int(os.getenv("IMPORT_WORKERS", "0")) or None
+# Largest CSV the upload endpoint imports. Each password takes ~0.15 s to
+# hash inside the request, so larger files go through import_users.py.
+app.config["IMPORT_MAX_ROWS"] = int(os.getenv("IMPORT_MAX_ROWS", "100"))
+
+# Admin reports are cached per process for REPORT_CACHE_TTL seconds (0
+# disables) and emptied whenever any process commits an attendance write
+app.config["REPORT_CACHE_TTL"] = int(os.getenv("REPORT_CACHE_TTL", "60"))
+app.config["REPORT_CACHE_MAX_BYTES"] = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Sampling profiler: admins profile a request by sending the X-Profile header;
+# PROFILE_SAMPLE_RATE (0-1) additionally profiles that fraction of API calls
+app.config["PROFILE_DIR"] = os.path.abspath(os.getenv("PROFILE_DIR", "profiles"))
+app.config["PROFILE_SAMPLE_RATE"] = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+app.config["PROFILE_INTERVAL"] = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+app.config["PROFILE_KEEP"] = int(os.getenv("PROFILE_KEEP", "200"))
+
+# Seconds between occupancy counter reconciliations (0 disables)
+app.config["OCCUPANCY_RECONCILE_SECONDS"] = int(os.getenv("OCCUPANCY_RECONCILE_SECONDS", "300"))
+
+# Sessions still open at this time of day are checked out automatically;
+# the sweeper runs every AUTO_CHECKOUT_SWEEP_SECONDS (0 disables)
+app.config["AUTO_CHECKOUT_TIME"] = parse_cutoff(os.getenv("AUTO_CHECKOUT_TIME", "23:59"))
+app.config["AUTO_CHECKOUT_SWEEP_SECONDS"] = int(os.getenv("AUTO_CHECKOUT_SWEEP_SECONDS", "900"))
+
 # Initialize database
 db.init_app(app)
 
 # Enable CORS
 CORS(app, supports_credentials=True)
 
+# On SQLite, requests that modify data take the write lock when they begin;
+# registered before any hook that may start a transaction
+init_write_intent(app)
+
+# Registered early so the profile covers the other request hooks
+init_profiling(app)
+
+# Compress large JSON / NDJSON / text responses, including streamed ones
+init_compression(app)
+
+# Serve repeated admin reports from memory, one computation per distinct request
+init_report_cache(app)
+
+# Index the built frontend once at startup
+static_assets = StaticAssets('frontend/dist')
+
 # Create tables if they don't exist
-with app.app_context():
+with app.app_context(), write_intent():
     db.create_all()
+    create_shard_tables()
+    ensure_report_version()
     
     # Add default locations if not already created
     if not Location.query.first():
@@ -65,28 +136,56 @@ with app.app_context():
         db.session.add(admin_user)
         db.session.commit()
         app.logger.info("Created default admin user: admin@senslyze.com with password: admin123")
+    
+    # Start occupancy counters from the database's view of who is checked in
+    reconcile_occupancy()
+
+run_periodically(app, 'occupancy-reconcile', app.config["OCCUPANCY_RECONCILE_SECONDS"], reconcile_occupancy)
+run_periodically(app, 'auto-checkout', app.config["AUTO_CHECKOUT_SWEEP_SECONDS"],
+                 lambda: sweep_stale_sessions(app.config["AUTO_CHECKOUT_TIME"]))
+
+@app.before_request
+def route_attendance_shard():
+    """Send the logged-in user's attendance queries to the shard holding their rows"""
+    user_id = session.get('user_id')
+    if not user_id or not request.path.startswith('/api/attendance/') or not sharding_enabled():
+        return None
+    
+    try:
+        shard = shard_for_user(user_id, for_write=request.method != 'GET')
+    except ShardUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    g.shard_token = activate_shard(shard)
+
+@app.teardown_request
+def reset_attendance_shard(exc):
+    token = g.pop('shard_token', None)
+    if token is not None:
+        deactivate_shard(token)
 
 # Auth Routes
 @app.route('/api/auth/register', methods=['POST'])
 def register():
     data = request.get_json()
     
-    # Check if email already exists
-    if User.query.filter_by(email=data.get('email')).first():
-        return jsonify({"error": "Email already registered"}), 400
-    
     user = User(
         name=data.get('name'),
         email=data.get('email')
     )
+    # Hash before the first query: on SQLite the request holds the write lock from then on
     user.set_password(data.get('password'))
     
+    # Check if email already exists
+    if User.query.filter_by(email=data.get('email')).first():
+        return jsonify({"error": "Email already registered"}), 400
+    
     db.session.add(user)
     db.session.commit()
     
     return jsonify({"message": "User registered successfully", "user": user.to_dict()}), 201
 
 @app.route('/api/auth/login', methods=['POST'])
+@reads_only
 def login():
     data = request.get_json()
     user = User.query.filter_by(email=data.get('email')).first()
@@ -147,19 +246,14 @@ def check_status():
         return jsonify({"error": "Not authenticated"}), 401
     
     today = date.today()
-    check_record = CheckinCheckout.query.filter_by(
-        user_id=user_id,
-        day=today,
-        checkout_time_stamp=None
-    ).first()
+    check_record = open_session_status(user_id, today)
     
     if check_record:
-        location = Location.query.get(check_record.location_id)
         return jsonify({
             "isCheckedIn": True,
             "id": check_record.id,
             "checkInTime": check_record.checkin_time_stamp.isoformat(),
-            "location": location.name if location else None
+            "location": location_name(check_record.location_id)
         }), 200
     else:
         return jsonify({"isCheckedIn": False}), 200
@@ -201,11 +295,7 @@ def check_in():
         return jsonify({"error": "No valid location found"}), 400
     
     today = date.today()
-    existing_record = CheckinCheckout.query.filter_by(
-        user_id=user_id,
-        day=today,
-        checkout_time_stamp=None
-    ).first()
+    existing_record = open_session_status(user_id, today)
     
     if existing_record:
         return jsonify({"error": "Already checked in today"}), 400
@@ -217,21 +307,18 @@ def check_in():
         checkin_time_stamp=datetime.now()
     )
     
+    # Store GPS data on the same row
+    if latitude and longitude:
+        check_record.geo_latitude = latitude
+        check_record.geo_longitude = longitude
+        check_record.geo_pincode = location.pincode
+        check_record.geo_address = address
+        check_record.geo_timestamp = check_record.checkin_time_stamp
+    
     db.session.add(check_record)
+    record_checkin(location.id)
     db.session.commit()
     
-    # Store GPS data
-    if latitude and longitude:
-        geo_location = GeoLocation(
-            latitude=latitude,
-            longitude=longitude,
-            pincode=location.pincode,
-            address=address,
-            checkin_id=check_record.id
-        )
-        db.session.add(geo_location)
-        db.session.commit()
-    
     return jsonify({
         "message": "Checked in successfully",
         "id": check_record.id,
@@ -261,11 +348,7 @@ def check_out():
         return jsonify({"error": f"Task, task status, and project name are required. Received: {data}"}), 400
     
     today = date.today()
-    check_record = CheckinCheckout.query.filter_by(
-        user_id=user_id,
-        day=today,
-        checkout_time_stamp=None
-    ).first()
+    check_record = open_session(user_id, today)
     
     if not check_record:
         return jsonify({"error": "No active check-in found"}), 400
@@ -274,6 +357,7 @@ def check_out():
     check_record.task = task
     check_record.task_status = task_status
     check_record.project_name = project_name
+    record_checkout(check_record.location_id)
     
     db.session.commit()
     
@@ -283,31 +367,137 @@ def check_out():
         "checkOutTime": check_record.checkout_time_stamp.isoformat()
     }), 200
 
+# History page size limits for paginated / delta-sync requests
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+def encode_history_token(*values):
+    """Encode keyset values as an opaque URL-safe token"""
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_token(token):
+    """Decode a token produced by encode_history_token into a list of values"""
+    return json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+
+def history_entry(record, location_names):
+    return {
+        'id': record.id,
+        'key': record_key(record.id),
+        'date': record.day.isoformat() if record.day else None,
+        'checkInTime': record.checkin_time_stamp.isoformat() if record.checkin_time_stamp else None,
+        'checkOutTime': record.checkout_time_stamp.isoformat() if record.checkout_time_stamp else None,
+        'location': location_names.get(record.location_id),
+        'task': record.task,
+        'taskStatus': record.task_status,
+        'projectName': record.project_name,
+        'autoClosed': record.auto_closed,
+        'updatedAt': record.updated_at.isoformat() if record.updated_at else None
+    }
+
 @app.route('/api/attendance/history', methods=['GET'])
 def get_history():
+    """Attendance history for the current user.
+
+    Without query parameters the full history is returned as a list. With
+    ``limit`` and/or ``cursor`` the newest records are paged backwards, and
+    with ``since`` only records created or changed after that sync token are
+    returned. Paged responses carry ``syncToken`` for the next delta request.
+    A sync token from before the user's organisation moved shard gets a 410
+    with ``resync``: record ids changed, so the client must start over.
+    """
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({"error": "Not authenticated"}), 401
     
-    records = CheckinCheckout.query.filter_by(user_id=user_id).order_by(
-        CheckinCheckout.day.desc(), 
-        CheckinCheckout.checkin_time_stamp.desc()
-    ).all()
-    
-    history = []
-    for record in records:
-        history.append({
-            'id': record.id,
-            'date': record.day.isoformat() if record.day else None,
-            'checkInTime': record.checkin_time_stamp.isoformat() if record.checkin_time_stamp else None,
-            'checkOutTime': record.checkout_time_stamp.isoformat() if record.checkout_time_stamp else None,
-            'location': record.location.name if record.location else None,
-            'task': record.task,
-            'taskStatus': record.task_status,
-            'projectName': record.project_name
-        })
+    location_names = {loc.id: loc.name for loc in Location.query.all()}
+    since = request.args.get('since')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
+    
+    if not (since or cursor or limit):
+        records = CheckinCheckout.query.filter_by(user_id=user_id).order_by(
+            CheckinCheckout.day.desc(), 
+            CheckinCheckout.checkin_time_stamp.desc()
+        ).all()
+        return jsonify([history_entry(record, location_names) for record in records]), 200
+    
+    limit = min(max(limit or HISTORY_PAGE_SIZE, 1), HISTORY_MAX_PAGE_SIZE)
+    query = CheckinCheckout.query.filter_by(user_id=user_id)
+    
+    if since:
+        # Delta sync: everything changed after the token, oldest change first
+        try:
+            updated_at, record_id, *token_shard = decode_history_token(since)
+            updated_at = datetime.fromisoformat(updated_at)
+            if type(record_id) is not int:
+                raise TypeError("record id must be an integer")
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid sync token"}), 400
+        if token_shard and token_shard[0] != current_shard():
+            return jsonify({"error": "Attendance history was moved; sync again without since",
+                            "resync": True}), 410
+        
+        records = query.filter(
+            db.tuple_(CheckinCheckout.updated_at, CheckinCheckout.id) > (updated_at, record_id)
+        ).order_by(
+            CheckinCheckout.updated_at.asc(),
+            CheckinCheckout.id.asc()
+        ).limit(limit + 1).all()
+        
+        has_more = len(records) > limit
+        records = records[:limit]
+        sync_token = since
+        if records:
+            sync_token = encode_history_token(records[-1].updated_at, records[-1].id, current_shard())
+        
+        return jsonify({
+            "records": [history_entry(record, location_names) for record in records],
+            "syncToken": sync_token,
+            "hasMore": has_more
+        }), 200
     
-    return jsonify(history), 200
+    if cursor:
+        # Older page: continue after the last (day, check-in, id) of the previous page
+        try:
+            day, checkin_time, record_id = decode_history_token(cursor)
+            day = date.fromisoformat(day)
+            checkin_time = datetime.fromisoformat(checkin_time)
+            if type(record_id) is not int:
+                raise TypeError("record id must be an integer")
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+        
+        query = query.filter(
+            db.tuple_(CheckinCheckout.day, CheckinCheckout.checkin_time_stamp, CheckinCheckout.id)
+            < (day, checkin_time, record_id)
+        )
+    
+    records = query.order_by(
+        CheckinCheckout.day.desc(),
+        CheckinCheckout.checkin_time_stamp.desc(),
+        CheckinCheckout.id.desc()
+    ).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        last = records[-1]
+        next_cursor = encode_history_token(last.day, last.checkin_time_stamp, last.id)
+    
+    # The sync token covers the whole history, not just this page
+    latest = db.session.query(CheckinCheckout.updated_at, CheckinCheckout.id).filter_by(
+        user_id=user_id
+    ).order_by(
+        CheckinCheckout.updated_at.desc(),
+        CheckinCheckout.id.desc()
+    ).first()
+    
+    return jsonify({
+        "records": [history_entry(record, location_names) for record in records],
+        "nextCursor": next_cursor,
+        "syncToken": encode_history_token(*latest, current_shard()) if latest else None
+    }), 200
 
 # Health check endpoint
 @app.route('/api/health')
@@ -362,21 +552,136 @@ def delete_user(user_id):
     if not user:
         return jsonify({"error": "User not found"}), 404
     
-    db.session.delete(user)
-    db.session.commit()
+    with user_shard(user_id):
+        db.session.delete(user)
+        db.session.commit()
     
     return jsonify({"message": f"User {user.name} deleted successfully"})
 
+@app.route('/api/admin/users/import', methods=['POST'])
+@admin_required
+def import_users_csv():
+    """Create users from a CSV upload (admin only).
+
+    Accepts a multipart ``file`` field or a raw text/csv body with columns
+    name, email, password and optionally is_admin, of at most
+    IMPORT_MAX_ROWS rows. Valid rows are imported; the rest are reported by
+    line number.
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    max_rows = app.config["IMPORT_MAX_ROWS"]
+    
+    try:
+        # Parse the whole upload first, so a malformed file creates nobody
+        rows = list(itertools.islice(read_user_csv(stream), max_rows + 1))
+    except (ValueError, csv.Error) as e:
+        return jsonify({"error": f"Invalid CSV: {e}", "created": 0, "errors": []}), 400
+    if len(rows) > max_rows:
+        return jsonify({
+            "error": f"At most {max_rows} users can be imported per upload; use import_users.py for larger files",
+            "created": 0,
+            "errors": []
+        }), 413
+    
+    # Hash in this process: a web worker is no place for a process pool
+    result = import_users(rows, workers=1)
+    app.logger.info(f"Bulk import: {result['created']} users created, {len(result['errors'])} rows rejected")
+    return jsonify(result), 200
+
+def attendance_load_options():
+    """Loader options so CheckinCheckout.to_dict() needs no per-row queries.
+
+    User and location live on the primary database, so they are loaded with
+    separate IN queries rather than joined to a (possibly sharded) table.
+    """
+    return (
+        selectinload(CheckinCheckout.user),
+        selectinload(CheckinCheckout.location),
+    )
+
+def attendance_filters_from_request():
+    """Normalise the admin attendance query parameters.
+
+    Returns ``(filters, error)``; ``filters`` only contains parameters that
+    were supplied, so equal requests produce equal dicts.
+    """
+    filters = {}
+    try:
+        if request.args.get('start'):
+            filters['start'] = date.fromisoformat(request.args['start'])
+        if request.args.get('end'):
+            filters['end'] = date.fromisoformat(request.args['end'])
+    except ValueError:
+        return None, "Dates must be in YYYY-MM-DD format"
+    
+    for name in ('user_id', 'location_id'):
+        if request.args.get(name):
+            value = request.args.get(name, type=int)
+            if value is None:
+                return None, f"{name} must be an integer"
+            filters[name] = value
+    
+    for name in ('project_name', 'task_status'):
+        if request.args.get(name):
+            filters[name] = request.args[name]
+    
+    if request.args.get('open', '').lower() in ('1', 'true', 'yes'):
+        filters['open'] = True
+    
+    return filters, None
+
+def filtered_attendance_query(filters):
+    """CheckinCheckout query with the admin filters applied as one WHERE clause"""
+    query = CheckinCheckout.query
+    if 'start' in filters:
+        query = query.filter(CheckinCheckout.day >= filters['start'])
+    if 'end' in filters:
+        query = query.filter(CheckinCheckout.day <= filters['end'])
+    if 'user_id' in filters:
+        query = query.filter(CheckinCheckout.user_id == filters['user_id'])
+    if 'location_id' in filters:
+        query = query.filter(CheckinCheckout.location_id == filters['location_id'])
+    if 'project_name' in filters:
+        query = query.filter(CheckinCheckout.project_name == filters['project_name'])
+    if 'task_status' in filters:
+        query = query.filter(CheckinCheckout.task_status == filters['task_status'])
+    if filters.get('open'):
+        query = query.filter(CheckinCheckout.checkout_time_stamp.is_(None))
+    return query
+
 @app.route('/api/admin/attendance')
 @admin_required
 def get_all_attendance():
-    """Get all attendance records (admin only)"""
-    records = CheckinCheckout.query.order_by(
-        CheckinCheckout.day.desc(),
-        CheckinCheckout.checkin_time_stamp.desc()
-    ).all()
-    
-    return jsonify([record.to_dict() for record in records])
+    """Get attendance records, optionally filtered (admin only).
+
+    Query parameters: start, end (YYYY-MM-DD), user_id, location_id,
+    project_name, task_status and open=true for sessions not checked out.
+    """
+    filters, error = attendance_filters_from_request()
+    if error:
+        return jsonify({"error": error}), 400
+    
+    def shard_records():
+        records = filtered_attendance_query(filters).options(*attendance_load_options()).order_by(
+            CheckinCheckout.day.desc(),
+            CheckinCheckout.checkin_time_stamp.desc()
+        ).all()
+        return [record.to_dict() for record in records]
+    
+    def build():
+        if 'user_id' in filters:
+            with user_shard(filters['user_id']):
+                records = shard_records()
+        else:
+            records = merge_sorted(
+                scatter_gather(shard_records),
+                key=lambda record: (record['day'], record['checkin_time_stamp']),
+                reverse=True
+            )
+        return jsonify(records)
+    
+    return report_cache.response(report_key('attendance', **filters), build)
 
 @app.route('/api/admin/attendance/<int:user_id>')
 @admin_required
@@ -386,12 +691,18 @@ def get_user_attendance(user_id):
     if not user:
         return jsonify({"error": "User not found"}), 404
     
-    records = CheckinCheckout.query.filter_by(user_id=user_id).order_by(
-        CheckinCheckout.day.desc(),
-        CheckinCheckout.checkin_time_stamp.desc()
-    ).all()
-    
-    return jsonify([record.to_dict() for record in records])
+    def build():
+        with user_shard(user_id):
+            records = CheckinCheckout.query.options(*attendance_load_options()).filter_by(
+                user_id=user_id
+            ).order_by(
+                CheckinCheckout.day.desc(),
+                CheckinCheckout.checkin_time_stamp.desc()
+            ).all()
+            
+            return jsonify([record.to_dict() for record in records])
+    
+    return report_cache.response(report_key('user_attendance', user_id=user_id), build)
 
 @app.route('/api/admin/attendance/export/<int:user_id>')
 @admin_required
@@ -410,54 +721,190 @@ def export_user_attendance(user_id):
     start_date = date(year, month, 1)
     end_date = date(year, month, last_day)
     
-    # Get records for the specified month
-    records = CheckinCheckout.query.filter(
-        CheckinCheckout.user_id == user_id,
-        CheckinCheckout.day >= start_date,
-        CheckinCheckout.day <= end_date
-    ).order_by(
-        CheckinCheckout.day.asc(),
-        CheckinCheckout.checkin_time_stamp.asc()
-    ).all()
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Date', 'Check-in Time', 'Check-out Time', 'Location', 
-                    'Task', 'Task Status', 'Project Name', 'Hours Worked'])
-    
-    # Write data rows
-    for record in records:
-        # Calculate hours worked if both check-in and check-out exist
-        hours_worked = ""
-        if record.checkin_time_stamp and record.checkout_time_stamp:
-            duration = record.checkout_time_stamp - record.checkin_time_stamp
-            hours_worked = f"{duration.total_seconds() / 3600:.2f}"
+    def build():
+        # Get records for the specified month
+        with user_shard(user_id):
+            records = CheckinCheckout.query.filter(
+                CheckinCheckout.user_id == user_id,
+                CheckinCheckout.day >= start_date,
+                CheckinCheckout.day <= end_date
+            ).order_by(
+                CheckinCheckout.day.asc(),
+                CheckinCheckout.checkin_time_stamp.asc()
+            ).all()
         
-        writer.writerow([
-            record.day.strftime('%Y-%m-%d') if record.day else "",
-            record.checkin_time_stamp.strftime('%H:%M:%S') if record.checkin_time_stamp else "",
-            record.checkout_time_stamp.strftime('%H:%M:%S') if record.checkout_time_stamp else "",
-            record.location.name if record.location else "",
-            record.task or "",
-            record.task_status or "",
-            record.project_name or "",
-            hours_worked
-        ])
-    
-    # Create response with CSV
-    output.seek(0)
-    month_name = datetime.strptime(str(month), "%m").strftime("%B")
-    filename = f"{user.name.replace(' ', '_')}_attendance_{month_name}_{year}.csv"
+        # Create CSV in memory
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(MONTHLY_CSV_HEADER)
+        
+        location_names = {loc.id: loc.name for loc in Location.query.all()}
+        for record in records:
+            writer.writerow(monthly_csv_row(record, location_names.get(record.location_id)))
+        
+        # Create response with CSV
+        filename = monthly_csv_filename(user.name, year, month)
+        
+        return Response(
+            output.getvalue(),
+            mimetype="text/csv",
+            headers={"Content-disposition": f"attachment; filename={filename}"}
+        )
     
+    return report_cache.response(report_key('user_export', user_id=user_id, year=year, month=month), build)
+
+@app.route('/api/admin/attendance/export')
+@admin_required
+def export_attendance():
+    """Stream attendance records for a date range as csv.gz, ndjson or parquet (admin only)"""
+    export_format = request.args.get('format', 'csv.gz')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format. Choose one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify({"error": "Parquet export requires the pyarrow package"}), 400
+
+    # Date range defaults to the current month
+    today = date.today()
+    try:
+        start_date = date.fromisoformat(request.args.get('start', today.replace(day=1).isoformat()))
+        end_date = date.fromisoformat(request.args.get('end', today.isoformat()))
+    except ValueError:
+        return jsonify({"error": "Dates must be in YYYY-MM-DD format"}), 400
+
+    user_id = request.args.get('user_id', type=int)
+
+    if user_id is not None and not User.query.get(user_id):
+        return jsonify({"error": "User not found"}), 404
+
+    batches = iter_export_batches(start_date, end_date, user_id=user_id)
+    extension = EXPORT_FORMATS[export_format]['extension']
+    filename = f"attendance_{start_date.isoformat()}_{end_date.isoformat()}.{extension}"
+
     return Response(
-        output.getvalue(),
-        mimetype="text/csv",
+        stream_with_context(stream_export(export_format, batches)),
+        mimetype=EXPORT_FORMATS[export_format]['mimetype'],
         headers={"Content-disposition": f"attachment; filename={filename}"}
     )
 
+@app.route('/api/admin/exports/monthly', methods=['POST'])
+@admin_required
+def create_monthly_export():
+    """Start (or reuse) the month-end export of every user's timesheet (admin only)"""
+    data = request.get_json() or {}
+    year = data.get('year', datetime.now().year)
+    month = data.get('month', datetime.now().month)
+    
+    if not isinstance(year, int) or not isinstance(month, int) or not 1 <= month <= 12:
+        return jsonify({"error": "Year and month (1-12) must be integers"}), 400
+    
+    job = start_monthly_export(year, month, created_by=session.get('user_id'), force=bool(data.get('force')))
+    return jsonify(job.to_dict()), 202
+
+@app.route('/api/admin/exports')
+@admin_required
+def get_export_jobs():
+    """List month-end export jobs, newest first (admin only)"""
+    jobs = ExportJob.query.order_by(ExportJob.year.desc(), ExportJob.month.desc()).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+@app.route('/api/admin/exports/<int:job_id>')
+@admin_required
+def get_export_job(job_id):
+    """Status and progress of a month-end export job (admin only)"""
+    job = ExportJob.query.get(job_id)
+    if not job:
+        return jsonify({"error": "Export job not found"}), 404
+    
+    return jsonify(job.to_dict())
+
+@app.route('/api/admin/exports/<int:job_id>/download')
+@admin_required
+def download_export_job(job_id):
+    """Download the zip produced by a completed export job (admin only)"""
+    job = ExportJob.query.get(job_id)
+    if not job:
+        return jsonify({"error": "Export job not found"}), 404
+    if job.status != 'completed' or not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({"error": f"Export is not ready (status: {job.status})"}), 409
+    
+    return send_file(job.file_path, mimetype="application/zip", as_attachment=True,
+                     download_name=os.path.basename(job.file_path))
+
+@app.route('/api/admin/attendance/heatmap')
+@admin_required
+def get_attendance_heatmap():
+    """Check-in GPS density aggregated into grid cells (admin only)"""
+    today = date.today()
+    try:
+        start_date = date.fromisoformat(request.args.get('start', today.replace(day=1).isoformat()))
+        end_date = date.fromisoformat(request.args.get('end', today.isoformat()))
+    except ValueError:
+        return jsonify({"error": "Dates must be in YYYY-MM-DD format"}), 400
+    
+    zoom = request.args.get('zoom', 10, type=int)
+    if not MIN_ZOOM <= zoom <= MAX_ZOOM:
+        return jsonify({"error": f"Zoom must be between {MIN_ZOOM} and {MAX_ZOOM}"}), 400
+    
+    def build():
+        return jsonify({
+            "start": start_date.isoformat(),
+            "end": end_date.isoformat(),
+            "zoom": zoom,
+            "cellSize": cell_size(zoom),
+            "cells": heatmap_cells(start_date, end_date, zoom)  # [latitude, longitude, count] per non-empty cell
+        })
+    
+    return report_cache.response(report_key('heatmap', start=start_date, end=end_date, zoom=zoom), build)
+
+@app.route('/api/admin/occupancy')
+@admin_required
+def get_occupancy():
+    """Number of people currently checked in at each office (admin only)"""
+    locations = occupancy_snapshot()
+    return jsonify({
+        "locations": locations,
+        "total": sum(location['occupied'] for location in locations)
+    })
+
+@app.route('/api/admin/occupancy/reconcile', methods=['POST'])
+@admin_required
+def reconcile_occupancy_counters():
+    """Recount occupancy from open check-ins now instead of waiting for the schedule (admin only)"""
+    reconcile_occupancy()
+    return jsonify({"locations": occupancy_snapshot()})
+
+@app.route('/api/admin/shards')
+@admin_required
+def get_shards():
+    """Shard map and per-shard attendance row counts (admin only)"""
+    counts = scatter_gather(lambda: CheckinCheckout.query.count())
+    return jsonify({
+        "shards": [{"name": name, "records": count} for name, count in zip(shard_names(), counts)],
+        "tenants": [assignment.to_dict() for assignment in ShardAssignment.query.order_by(ShardAssignment.tenant).all()]
+    })
+
+@app.route('/api/admin/profiles')
+@admin_required
+def get_profiles():
+    """Recent request profiles, newest first (admin only)"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({"header": PROFILE_HEADER, "profiles": list_profiles(limit)})
+
+@app.route('/api/admin/profiles/<profile_id>')
+@admin_required
+def download_profile(profile_id):
+    """Download a profile as collapsed stacks (default) or JSON with SQL timings (admin only)"""
+    profile_format = request.args.get('format', 'collapsed')
+    if profile_format not in ('collapsed', 'json'):
+        return jsonify({"error": "Format must be collapsed or json"}), 400
+    
+    path = profile_path(profile_id, f'.{profile_format}')
+    if not path:
+        return jsonify({"error": "Profile not found"}), 404
+    
+    mimetype = "text/plain" if profile_format == 'collapsed' else "application/json"
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=os.path.basename(path))
+
 # Serve frontend static files - but make sure this is AFTER all API routes
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -466,10 +913,7 @@ def serve(path):
     if path.startswith('api/'):
         return jsonify({"error": "API route not found"}), 404
     
-    if path != "" and os.path.exists(os.path.join('frontend/dist', path)):
-        return send_from_directory('frontend/dist', path)
-    else:
-        return send_from_directory('frontend/dist', 'index.html')
+    return static_assets.serve(path)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5002, debug=True)
\ No newline at end of file
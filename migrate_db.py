@@ -0,0 +1,117 @@
+import os
+import json
+from flask import Flask
+from sqlalchemy import inspect, text
+from database import bind_options, database_url, engine_options
+from models import db
+from shard_routing import DEFAULT_SHARD
+from sharding import create_shard_tables, shard_metadata
+
+# Create Flask app
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url()
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Attendance shards, configured the same way as in main.py
+shard_urls = json.loads(os.environ.get("SHARD_DATABASE_URLS", "{}"))
+app.config["SQLALCHEMY_BINDS"] = bind_options(shard_urls)
+app.config["ATTENDANCE_SHARDS"] = [DEFAULT_SHARD, *shard_urls]
+
+# Initialize database
+db.init_app(app)
+
+
+def column_exists(engine, table, column):
+    return column in {col['name'] for col in inspect(engine).get_columns(table)}
+
+
+def index_exists(engine, table, index):
+    return index in {idx['name'] for idx in inspect(engine).get_indexes(table)}
+
+
+def add_updated_at(engine):
+    """Add checkin_checkout.updated_at for history delta sync"""
+    if not column_exists(engine, 'checkin_checkout', 'updated_at'):
+        print("Adding checkin_checkout.updated_at...")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE checkin_checkout ADD COLUMN updated_at TIMESTAMP"))
+            conn.execute(text(
+                "UPDATE checkin_checkout SET updated_at = COALESCE(checkout_time_stamp, checkin_time_stamp)"
+            ))
+
+
+def add_auto_closed(engine):
+    """Add checkin_checkout.auto_closed for sessions closed by the sweeper"""
+    if not column_exists(engine, 'checkin_checkout', 'auto_closed'):
+        print("Adding checkin_checkout.auto_closed...")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE checkin_checkout ADD COLUMN auto_closed BOOLEAN NOT NULL DEFAULT FALSE"))
+
+
+def add_inline_geo(engine):
+    """Add checkin_checkout.geo_* columns and backfill them from geo_location"""
+    columns = {
+        'geo_latitude': 'FLOAT',
+        'geo_longitude': 'FLOAT',
+        'geo_pincode': 'VARCHAR(10)',
+        'geo_address': 'VARCHAR(255)',
+        'geo_timestamp': 'TIMESTAMP',
+    }
+    missing = [name for name in columns if not column_exists(engine, 'checkin_checkout', name)]
+    if missing:
+        print(f"Adding checkin_checkout.{', '.join(missing)}...")
+        with engine.begin() as conn:
+            for name in missing:
+                conn.execute(text(f"ALTER TABLE checkin_checkout ADD COLUMN {name} {columns[name]}"))
+
+    if not inspect(engine).has_table('geo_location'):
+        return
+    # The oldest geo_location row per check-in is the one the API used to return
+    first_geo = "(SELECT MIN(id) FROM geo_location WHERE checkin_id = checkin_checkout.id)"
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            "UPDATE checkin_checkout SET "
+            + ", ".join(
+                f"geo_{field} = (SELECT {field} FROM geo_location WHERE id = {first_geo})"
+                for field in ('latitude', 'longitude', 'pincode', 'address', 'timestamp')
+            )
+            + " WHERE geo_latitude IS NULL AND geo_longitude IS NULL"
+            " AND EXISTS (SELECT 1 FROM geo_location WHERE checkin_id = checkin_checkout.id)"
+        ))
+    if result.rowcount:
+        print(f"Backfilled GPS data for {result.rowcount} check-ins")
+
+
+def create_missing_indexes(engine, metadata):
+    """Create any index declared on the models that the database lacks"""
+    for table in metadata.sorted_tables:
+        if not inspect(engine).has_table(table.name):
+            continue
+        for index in table.indexes:
+            if not index_exists(engine, table.name, index.name):
+                print(f"Creating index {index.name}...")
+                index.create(engine)
+
+
+# Applied in order to the primary database and every shard; each step is
+# safe to run repeatedly
+MIGRATIONS = [
+    add_updated_at,
+    add_auto_closed,
+    add_inline_geo,
+]
+
+if __name__ == "__main__":
+    with app.app_context():
+        # New tables are created as usual; existing ones are altered below
+        db.create_all()
+        create_shard_tables()
+
+        for name, engine in [(DEFAULT_SHARD, db.engine), *((key, db.engines[key]) for key in shard_urls)]:
+            print(f"Migrating {name}...")
+            for migration in MIGRATIONS:
+                migration(engine)
+            create_missing_indexes(engine, db.metadata if name == DEFAULT_SHARD else shard_metadata())
+
+        print("Database migration complete!")
@@ -1,8 +1,9 @@
 import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
+from shard_routing import ShardRoutingSession, record_key
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": ShardRoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -43,6 +44,8 @@ class Location(db.Model):
             'name': self.name
         }
 
+# Superseded by the geo_* columns on CheckinCheckout; kept so migrate_db.py
+# can backfill existing rows and tenant moves carry legacy rows along
 class GeoLocation(db.Model):
     __tablename__ = 'geo_location'
     
@@ -52,7 +55,7 @@ class GeoLocation(db.Model):
     pincode = db.Column(db.String(10), nullable=True)
     address = db.Column(db.String(255), nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.now)
-    checkin_id = db.Column(db.Integer, db.ForeignKey('checkin_checkout.id'), nullable=True)
+    checkin_id = db.Column(db.Integer, db.ForeignKey('checkin_checkout.id'), nullable=True, index=True)
     
     def to_dict(self):
         return {
@@ -76,15 +79,51 @@ class CheckinCheckout(db.Model):
     task = db.Column(db.Text, nullable=True)
     task_status = db.Column(db.String(20), nullable=True)  # pending, blockage, completed
     project_name = db.Column(db.String(100), nullable=True)
+    # Set when the sweeper closed a session the user forgot to check out of
+    auto_closed = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Bumped on every write; used as the delta-sync token for history clients
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+    # GPS position reported at check-in, stored on the row itself
+    geo_latitude = db.Column(db.Float, nullable=True)
+    geo_longitude = db.Column(db.Float, nullable=True)
+    geo_pincode = db.Column(db.String(10), nullable=True)
+    geo_address = db.Column(db.String(255), nullable=True)
+    geo_timestamp = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_checkin_checkout_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_checkin_checkout_user_day', 'user_id', 'day', 'checkin_time_stamp'),
+        db.Index('ix_checkin_checkout_day', 'day', 'id'),
+        # Admin attendance filters: office / project / status within a date range
+        db.Index('ix_checkin_checkout_location_day', 'location_id', 'day',
+                 postgresql_include=['project_name', 'task_status', 'user_id']),
+        db.Index('ix_checkin_checkout_project_day', 'project_name', 'day'),
+        db.Index('ix_checkin_checkout_status_day', 'task_status', 'day'),
+        # Open sessions only; stays small however long the history grows
+        db.Index('ix_checkin_checkout_open', 'user_id', 'day',
+                 postgresql_where=db.text('checkout_time_stamp IS NULL'),
+                 sqlite_where=db.text('checkout_time_stamp IS NULL')),
+    )
 
     # Define relationships
     user = db.relationship('User', backref=db.backref('checkins', lazy=True))
     location = db.relationship('Location', backref=db.backref('checkins', lazy=True))
-    geo_location = db.relationship('GeoLocation', backref=db.backref('checkin', uselist=False), lazy=True)
+
+    def geo_dict(self):
+        if self.geo_latitude is None and self.geo_longitude is None:
+            return None
+        return {
+            'latitude': self.geo_latitude,
+            'longitude': self.geo_longitude,
+            'pincode': self.geo_pincode,
+            'address': self.geo_address,
+            'timestamp': self.geo_timestamp.isoformat() if self.geo_timestamp else None
+        }
 
     def to_dict(self):
         return {
             'id': self.id,
+            'key': record_key(self.id),
             'user_id': self.user_id,
             'user_name': self.user.name if self.user else None,
             'day': self.day.isoformat() if self.day else None,
@@ -95,5 +134,87 @@ class CheckinCheckout(db.Model):
             'task': self.task,
             'task_status': self.task_status,
             'project_name': self.project_name,
-            'geo_location': self.geo_location[0].to_dict() if self.geo_location and len(self.geo_location) > 0 else None
-        }
\ No newline at end of file
+            'auto_closed': self.auto_closed,
+            'geo_location': self.geo_dict()
+        }
+
+class ShardAssignment(db.Model):
+    __tablename__ = 'shard_assignment'
+
+    # Tenant key (organisation email domain) -> attendance shard name
+    tenant = db.Column(db.String(120), primary_key=True)
+    shard = db.Column(db.String(50), nullable=False)
+    read_only = db.Column(db.Boolean, nullable=False, default=False)  # set while a tenant is being moved
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+
+    def to_dict(self):
+        return {
+            'tenant': self.tenant,
+            'shard': self.shard,
+            'read_only': self.read_only,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class ExportJob(db.Model):
+    __tablename__ = 'export_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    file_path = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+
+    # One job per payroll month; re-running reuses the row
+    __table_args__ = (db.UniqueConstraint('year', 'month', name='uq_export_job_period'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'year': self.year,
+            'month': self.month,
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'progress': round(self.completed / self.total, 3) if self.total else None,
+            'error': self.error,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class LocationOccupancy(db.Model):
+    __tablename__ = 'location_occupancy'
+
+    # Checked-in headcount per office, maintained on check-in/check-out and
+    # periodically reconciled against open checkin_checkout rows
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id', ondelete='CASCADE'), primary_key=True)
+    occupied = db.Column(db.Integer, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+
+    location = db.relationship('Location', backref=db.backref('occupancy', uselist=False, lazy=True))
+
+    def to_dict(self):
+        return {
+            'location_id': self.location_id,
+            'location_name': self.location.name if self.location else None,
+            'occupied': self.occupied,
+            'reconciled_at': self.reconciled_at.isoformat() if self.reconciled_at else None
+        }
+
+class ReportVersion(db.Model):
+    __tablename__ = 'report_version'
+
+    # A single row, bumped in every transaction that writes attendance,
+    # users or locations; cached admin reports are only served while it is
+    # unchanged, so writes from any worker or instance invalidate them
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
@@ -0,0 +1,94 @@
+import logging
+from collections import Counter
+from datetime import date, datetime
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Location, LocationOccupancy, CheckinCheckout
+from sharding import scatter_gather
+
+logger = logging.getLogger(__name__)
+
+
+def _adjust(location_id, delta):
+    # Single atomic UPDATE so concurrent check-ins from any worker never lose
+    # an increment; the count is clamped at zero in case of earlier drift
+    result = db.session.execute(
+        update(LocationOccupancy)
+        .where(LocationOccupancy.location_id == location_id)
+        .values(occupied=case(
+            (LocationOccupancy.occupied + delta < 0, 0),
+            else_=LocationOccupancy.occupied + delta
+        ))
+    )
+    if result.rowcount == 0 and delta > 0:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(LocationOccupancy).values(location_id=location_id, occupied=delta))
+        except IntegrityError:
+            _adjust(location_id, delta)
+
+
+def record_checkin(location_id):
+    """Count a check-in at ``location_id``; runs in the caller's transaction"""
+    _adjust(location_id, 1)
+
+
+def record_checkout(location_id):
+    """Count a check-out at ``location_id``; runs in the caller's transaction"""
+    _adjust(location_id, -1)
+
+
+def occupancy_snapshot():
+    """Current headcount per office, read from the counters (one small-table query)"""
+    locations = Location.query.order_by(Location.id).all()
+    counters = {row.location_id: row for row in LocationOccupancy.query.all()}
+    return [{
+        'location_id': location.id,
+        'location_name': location.name,
+        'occupied': counters[location.id].occupied if location.id in counters else 0,
+        'reconciled_at': (counters[location.id].reconciled_at.isoformat()
+                          if location.id in counters and counters[location.id].reconciled_at else None)
+    } for location in locations]
+
+
+def reconcile_occupancy():
+    """Recount today's open sessions per office and overwrite the counters.
+
+    Heals drift from crashed requests, deleted users, sessions closed by the
+    auto-checkout sweeper and sessions left open from previous days.
+    """
+    def shard_counts():
+        return dict(
+            db.session.query(CheckinCheckout.location_id, func.count()).filter(
+                CheckinCheckout.day == date.today(),
+                CheckinCheckout.checkout_time_stamp.is_(None)
+            ).group_by(CheckinCheckout.location_id).all()
+        )
+
+    # Lock the counters before counting: a check-in's _adjust then either
+    # committed before the count (and is counted) or waits for this
+    # transaction and applies its delta on top of the recount
+    counters = {row.location_id: row for row in LocationOccupancy.query.with_for_update().all()}
+
+    totals = Counter()
+    for counts in scatter_gather(shard_counts):
+        totals.update(counts)
+
+    now = datetime.now()
+    drifted = 0
+    for location in Location.query.all():
+        counter = counters.get(location.id)
+        if counter is None:
+            counter = LocationOccupancy(location_id=location.id, occupied=0)
+            db.session.add(counter)
+        if counter.occupied != totals.get(location.id, 0):
+            drifted += 1
+        counter.occupied = totals.get(location.id, 0)
+        counter.reconciled_at = now
+    db.session.commit()
+
+    if drifted:
+        logger.info(f"Occupancy reconciled; corrected {drifted} office counter(s)")
+    return totals
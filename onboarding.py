@@ -0,0 +1,177 @@
+import csv
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+# Rows checked and inserted together: one uniqueness query and one
+# multi-row INSERT per batch
+IMPORT_BATCH_SIZE = 1000
+
+# Below this many passwords, starting a process pool costs more than it saves
+MIN_POOL_PASSWORDS = 64
+
+REQUIRED_COLUMNS = ('name', 'email', 'password')
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+
+
+def read_user_csv(stream):
+    """Yield ``(line_number, row)`` for each record of a binary CSV stream.
+
+    The header must contain name, email and password; is_admin is optional.
+    Raises ValueError when the header is missing a required column.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    columns = {(name or '').strip().lower() for name in reader.fieldnames or ()}
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError(f"CSV header is missing column(s): {', '.join(missing)}")
+
+    for row in reader:
+        yield reader.line_num, {(key or '').strip().lower(): (value or '').strip()
+                                for key, value in row.items() if key is not None}
+
+
+def _validate(row):
+    if not row.get('name'):
+        return "name is required"
+    if len(row['name']) > User.name.type.length:
+        return f"name is longer than {User.name.type.length} characters"
+    email = row.get('email', '')
+    if '@' not in email or email.startswith('@') or email.endswith('@'):
+        return "email is not a valid address"
+    if len(email) > User.email.type.length:
+        return f"email is longer than {User.email.type.length} characters"
+    if not row.get('password'):
+        return "password is required"
+    return None
+
+
+def _batches(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _existing_emails(emails):
+    return set(db.session.execute(select(User.email).where(User.email.in_(emails))).scalars())
+
+
+def _insert(batch, errors):
+    """Insert ``[(line, values)]`` in one statement; returns the number created.
+
+    A concurrent registration can take an email between the uniqueness check
+    and the INSERT; those rows are reported and the rest inserted again.
+    """
+    try:
+        db.session.execute(insert(User), [values for _, values in batch])
+        db.session.commit()
+        return len(batch)
+    except IntegrityError as e:
+        db.session.rollback()
+        conflict = e
+
+    taken = _existing_emails([values['email'] for _, values in batch])
+    remaining = []
+    for line, values in batch:
+        if values['email'] in taken:
+            errors.append({'line': line, 'email': values['email'], 'error': "Email already registered"})
+        else:
+            remaining.append((line, values))
+    if len(remaining) == len(batch):
+        # Not an email conflict (e.g. a NOT NULL or length constraint)
+        raise conflict
+    return _insert(remaining, errors) if remaining else 0
+
+
+def import_users(rows, workers=None, batch_size=IMPORT_BATCH_SIZE):
+    """Create users from ``(line_number, row)`` pairs, e.g. from read_user_csv.
+
+    Emails are checked against the database a batch at a time, passwords are
+    hashed in a pool of ``workers`` processes (in this one when ``workers``
+    is 1) and each batch is written with one multi-row INSERT. Invalid or
+    duplicate rows are skipped and reported; the rest are imported.
+
+    Returns ``{"created": n, "errors": [{line, email, error}]}``. If reading
+    ``rows`` fails part-way (a malformed CSV), the batches already imported
+    stay and the result also carries ``"error"``.
+    """
+    created = 0
+    errors = []
+    seen = set()
+    pool = None
+    pool_workers = workers or os.cpu_count() or 1
+    now = datetime.now()
+    parse_error = None
+
+    try:
+        for batch in _batches(rows, batch_size):
+            valid = []
+            for line, row in batch:
+                error = _validate(row)
+                if error is None and row['email'] in seen:
+                    error = "Duplicate email in file"
+                if error:
+                    errors.append({'line': line, 'email': row.get('email'), 'error': error})
+                    continue
+                seen.add(row['email'])
+                valid.append((line, row))
+
+            taken = _existing_emails([row['email'] for _, row in valid]) if valid else set()
+            # Don't hold the transaction (and SQLite's write lock) while hashing
+            db.session.commit()
+            new = []
+            for line, row in valid:
+                if row['email'] in taken:
+                    errors.append({'line': line, 'email': row['email'], 'error': "Email already registered"})
+                else:
+                    new.append((line, row))
+            if not new:
+                continue
+
+            passwords = [row['password'] for _, row in new]
+            if pool is None and pool_workers > 1 and len(passwords) >= MIN_POOL_PASSWORDS:
+                pool = ProcessPoolExecutor(max_workers=pool_workers)
+            if pool is not None:
+                chunksize = max(1, len(passwords) // (pool_workers * 4))
+                hashes = list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+            else:
+                hashes = [generate_password_hash(password) for password in passwords]
+
+            created += _insert([
+                (line, {
+                    'name': row['name'],
+                    'email': row['email'],
+                    'password': password_hash,
+                    'is_admin': row.get('is_admin', '').lower() in TRUE_VALUES,
+                    'created_at': now,
+                })
+                for (line, row), password_hash in zip(new, hashes)
+            ], errors)
+    except (ValueError, csv.Error) as e:
+        parse_error = f"Invalid CSV: {e}"
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    errors.sort(key=lambda error: error['line'])
+    logger.info(f"Imported {created} users, {len(errors)} rows rejected")
+    result = {'created': created, 'errors': errors}
+    if parse_error:
+        logger.warning(f"Import stopped early: {parse_error}")
+        result['error'] = parse_error
+    return result
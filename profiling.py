@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import current_app, g, request, session
+from sqlalchemy import event
+
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+# Admins send this header (any value) to profile a single request
+PROFILE_HEADER = 'X-Profile'
+
+PROFILE_ID_PATTERN = re.compile(r'[0-9]{8}T[0-9]{6}-[0-9a-f]{8}')
+
+# Longest SQL text kept per statement in a profile
+MAX_STATEMENT_LENGTH = 2000
+
+# SQL timings of the profile running in the current request, if any
+_current_sql = ContextVar('profile_sql', default=None)
+_listening_engines = set()
+_listen_lock = threading.Lock()
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's call stack every ``interval`` seconds.
+
+    ``counts`` maps collapsed stacks ("outer;inner;leaf", the format read by
+    flamegraph.pl and speedscope) to the number of samples seen.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name=f"profiler-{thread_id}", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _listen(engine):
+    # Listeners are attached the first time an engine is profiled, so
+    # requests never pay for them while profiling is unused
+    with _listen_lock:
+        if engine in _listening_engines:
+            return
+        _listening_engines.add(engine)
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def start_timer(conn, cursor, statement, parameters, context, executemany):
+            if _current_sql.get() is not None:
+                conn.info.setdefault('profile_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def record_timing(conn, cursor, statement, parameters, context, executemany):
+            timings = _current_sql.get()
+            if timings is not None and conn.info.get('profile_start'):
+                elapsed = time.perf_counter() - conn.info['profile_start'].pop()
+                timings.append({
+                    'statement': ' '.join(statement.split())[:MAX_STATEMENT_LENGTH],
+                    'ms': round(elapsed * 1000, 3),
+                    'engine': engine.url.render_as_string(),
+                })
+
+
+def _should_profile(app):
+    if not request.path.startswith('/api/') or request.path.startswith('/api/admin/profiles'):
+        return False
+    if PROFILE_HEADER in request.headers:
+        user_id = session.get('user_id')
+        user = db.session.get(User, user_id) if user_id else None
+        return bool(user and user.is_admin)
+    rate = app.config.get("PROFILE_SAMPLE_RATE", 0)
+    return rate > 0 and random.random() < rate
+
+
+def profile_dir():
+    return current_app.config.get("PROFILE_DIR", "profiles")
+
+
+def _start(app):
+    if not _should_profile(app):
+        return
+    for engine in db.engines.values():
+        _listen(engine)
+    sampler = StackSampler(threading.get_ident(), app.config.get("PROFILE_INTERVAL", 0.005))
+    g.profile = {
+        'id': f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}",
+        'sampler': sampler,
+        'sql': [],
+        'sql_token': None,
+        'started': time.perf_counter(),
+        'cpu_started': time.thread_time(),
+    }
+    g.profile['sql_token'] = _current_sql.set(g.profile['sql'])
+    sampler.start()
+
+
+def _finish(app, status):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return None
+    profile['sampler'].stop()
+    _current_sql.reset(profile['sql_token'])
+    duration = time.perf_counter() - profile['started']
+
+    metadata = {
+        'id': profile['id'],
+        'created_at': datetime.now().isoformat(),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': status,
+        'duration_ms': round(duration * 1000, 3),
+        'cpu_ms': round((time.thread_time() - profile['cpu_started']) * 1000, 3),
+        'interval_ms': profile['sampler'].interval * 1000,
+        'samples': sum(profile['sampler'].counts.values()),
+        'sql_count': len(profile['sql']),
+        'sql_ms': round(sum(timing['ms'] for timing in profile['sql']), 3),
+        'sql': profile['sql'],
+    }
+
+    try:
+        out_dir = profile_dir()
+        os.makedirs(out_dir, exist_ok=True)
+        base = os.path.join(out_dir, profile['id'])
+        with open(base + '.collapsed', 'w') as f:
+            for stack, count in profile['sampler'].counts.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + '.json.tmp', 'w') as f:
+            json.dump(metadata, f)
+        # The metadata file marks the profile complete, so it is written last
+        os.replace(base + '.json.tmp', base + '.json')
+        _prune(out_dir, app.config.get("PROFILE_KEEP", 200))
+    except OSError:
+        logger.exception(f"Could not write profile {profile['id']}")
+        return None
+    return profile['id']
+
+
+def _prune(out_dir, keep):
+    ids = sorted(name[:-len('.json')] for name in os.listdir(out_dir) if name.endswith('.json'))
+    for profile_id in ids[:-keep] if keep else []:
+        for suffix in ('.json', '.collapsed'):
+            try:
+                os.remove(os.path.join(out_dir, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(limit=50):
+    """Metadata of the most recent profiles, newest first, without SQL detail"""
+    out_dir = profile_dir()
+    if not os.path.isdir(out_dir):
+        return []
+    profiles = []
+    for name in sorted((n for n in os.listdir(out_dir) if n.endswith('.json')), reverse=True)[:limit]:
+        try:
+            with open(os.path.join(out_dir, name)) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        metadata.pop('sql', None)
+        profiles.append(metadata)
+    return profiles
+
+
+def profile_path(profile_id, suffix):
+    """Path of a stored profile file, or None if the id is malformed or unknown"""
+    if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+        return None
+    path = os.path.join(profile_dir(), profile_id + suffix)
+    return path if os.path.exists(path) else None
+
+
+def init_profiling(app):
+    """Profile admin requests carrying PROFILE_HEADER and a PROFILE_SAMPLE_RATE fraction of API requests"""
+
+    @app.before_request
+    def start_profile():
+        _start(app)
+
+    @app.after_request
+    def finish_profile(response):
+        profile_id = _finish(app, response.status_code)
+        if profile_id:
+            response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        # Reached with a profile still running only when the handler raised
+        if 'profile' in g:
+            _finish(app, 500)
@@ -0,0 +1,49 @@
+"""Statements for the attendance hot path, built once at import.
+
+Building a ``Model.query.filter_by(...)`` chain on every request costs more
+CPU than the indexed lookup it sends. These statements are constants with
+bound parameters, so a request only supplies values: SQLAlchemy finds the
+compiled SQL in the engine's compiled cache, and on psycopg 3 the driver
+reuses a server-side prepared statement (see ``database.engine_options``).
+"""
+from sqlalchemy import bindparam, select
+
+from models import db, Location, CheckinCheckout
+
+# Today's open session for a user; served by ix_checkin_checkout_open
+OPEN_SESSION = (
+    select(CheckinCheckout)
+    .where(
+        CheckinCheckout.user_id == bindparam('user_id'),
+        CheckinCheckout.day == bindparam('day'),
+        CheckinCheckout.checkout_time_stamp.is_(None)
+    )
+    .limit(1)
+)
+
+# The columns /api/attendance/status needs, without loading the entity
+OPEN_SESSION_STATUS = (
+    select(CheckinCheckout.id, CheckinCheckout.checkin_time_stamp, CheckinCheckout.location_id)
+    .where(
+        CheckinCheckout.user_id == bindparam('user_id'),
+        CheckinCheckout.day == bindparam('day'),
+        CheckinCheckout.checkout_time_stamp.is_(None)
+    )
+    .limit(1)
+)
+
+LOCATION_NAME = select(Location.name).where(Location.id == bindparam('location_id'))
+
+
+def open_session(user_id, day):
+    """The user's open CheckinCheckout for ``day``, or None"""
+    return db.session.execute(OPEN_SESSION, {'user_id': user_id, 'day': day}).scalars().first()
+
+
+def open_session_status(user_id, day):
+    """(id, checkin_time_stamp, location_id) of the user's open session, or None"""
+    return db.session.execute(OPEN_SESSION_STATUS, {'user_id': user_id, 'day': day}).first()
+
+
+def location_name(location_id):
+    return db.session.execute(LOCATION_NAME, {'location_id': location_id}).scalar()
@@ -0,0 +1,26 @@
+import sys
+
+from main import app
+from models import ShardAssignment
+from sharding import move_tenant, shard_names
+
+USAGE = """Usage:
+    python rebalance_shards.py list
+    python rebalance_shards.py move <tenant> <shard>
+"""
+
+if __name__ == "__main__":
+    with app.app_context():
+        if len(sys.argv) == 2 and sys.argv[1] == "list":
+            print(f"Shards: {', '.join(shard_names())}")
+            for assignment in ShardAssignment.query.order_by(ShardAssignment.tenant).all():
+                flag = " (read-only)" if assignment.read_only else ""
+                print(f"{assignment.tenant} -> {assignment.shard}{flag}")
+        elif len(sys.argv) == 4 and sys.argv[1] == "move":
+            tenant, target = sys.argv[2], sys.argv[3]
+            print(f"Moving {tenant} to {target}...")
+            copied = move_tenant(tenant, target)
+            print(f"Moved {copied} attendance records.")
+        else:
+            print(USAGE)
+            sys.exit(1)
@@ -0,0 +1,219 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, User, Location, ReportVersion
+from shard_routing import SHARDED_TABLES
+
+# Tables whose rows appear in cached reports; a committed write to any of
+# them empties the cache
+REPORT_TABLES = SHARDED_TABLES | {User.__table__.name, Location.__table__.name}
+
+
+def report_key(name, **params):
+    """Cache key for report ``name``; parameter order and None values do not matter"""
+    return (name, tuple(sorted((k, v) for k, v in params.items() if v is not None)))
+
+
+class _Flight:
+    """One in-progress computation that concurrent identical requests wait on"""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ReportCache:
+    """Per-process cache of rendered admin report responses.
+
+    Entries expire after ``ttl`` seconds and the least recently used are
+    evicted once their bodies exceed ``max_bytes``. Concurrent requests in
+    this process for the same key share a single computation (so only with
+    a threaded worker class; a sync gunicorn worker serves one request at a
+    time). Writes committed by this process invalidate everything at once.
+    When ``version`` is set, it is called before every lookup and a change
+    in its result (writes by other processes, see ReportVersion) also
+    invalidates everything.
+    """
+
+    def __init__(self, ttl=60, max_bytes=64 * 1024 * 1024, version=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.version = version
+        self.size = 0
+        self.generation = 0
+        self._seen_version = None
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def response(self, key, build):
+        """Serve ``key`` from the cache, or call ``build()`` (returning a Response) and cache it.
+
+        Only 200 responses are cached; an exception from ``build`` is raised
+        in every request that was waiting on it.
+        """
+        if not self.ttl:
+            return build()
+
+        # Read before building, so a write committed during the build is
+        # seen as a change by the next request
+        version = self.version() if self.version is not None else None
+        now = time.monotonic()
+        with self._lock:
+            if version != self._seen_version:
+                self._seen_version = version
+                self._clear()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return self._respond(entry[1], 'HIT')
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight(self.generation)
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self._respond(flight.result, 'SHARED')
+
+        try:
+            response = build()
+            flight.result = (response.status_code,
+                             [(k, v) for k, v in response.headers.items() if k.lower() != 'content-length'],
+                             response.get_data())
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if flight.error is None and flight.result[0] == 200 and flight.generation == self.generation:
+                    self._store(key, flight.result, now)
+            flight.done.set()
+
+        return self._respond(flight.result, 'MISS')
+
+    def _store(self, key, result, now):
+        size = len(result[2])
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[1][2])
+        self._entries[key] = (now + self.ttl, result)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted[2])
+
+    @staticmethod
+    def _respond(result, outcome):
+        status, headers, body = result
+        response = Response(body, status=status, headers=headers)
+        response.headers['X-Cache'] = outcome
+        return response
+
+    def invalidate(self):
+        """Drop every entry; computations already running are not stored"""
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self.size = 0
+
+
+def current_report_version():
+    return db.session.execute(select(ReportVersion.version).where(ReportVersion.id == 1)).scalar()
+
+
+report_cache = ReportCache(version=current_report_version)
+
+
+def _writes_report_table(context):
+    if not (context.isinsert or context.isupdate or context.isdelete):
+        return False
+    table = getattr(context.compiled.statement, 'table', None)
+    # Assume a write we cannot attribute to a table affects reports
+    return table is None or getattr(table, 'name', None) in REPORT_TABLES
+
+
+def _track_writes(engine):
+    @event.listens_for(engine, "after_cursor_execute")
+    def mark_write(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _writes_report_table(context):
+            conn.info['report_tables_written'] = True
+
+    @event.listens_for(engine, "commit")
+    def invalidate_on_commit(conn):
+        if conn.info.pop('report_tables_written', False):
+            report_cache.invalidate()
+
+    @event.listens_for(engine, "rollback")
+    def forget_on_rollback(conn):
+        conn.info.pop('report_tables_written', None)
+
+
+def _mark_flush(session, flush_context):
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if obj.__table__.name in REPORT_TABLES:
+            session.info['report_tables_written'] = True
+            return
+
+
+def _mark_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is None or getattr(table, 'name', None) in REPORT_TABLES:
+            orm_execute_state.session.info['report_tables_written'] = True
+
+
+def _bump_version(session):
+    session.flush()
+    if session.info.pop('report_tables_written', False):
+        # Emitted last, so the row lock is only held while the transaction commits
+        session.execute(
+            update(ReportVersion).where(ReportVersion.id == 1).values(version=ReportVersion.version + 1)
+        )
+
+
+def _forget_writes(session):
+    session.info.pop('report_tables_written', None)
+
+
+def ensure_report_version():
+    """Create the ReportVersion row if the database does not have it yet"""
+    if db.session.get(ReportVersion, 1) is None:
+        try:
+            db.session.add(ReportVersion(id=1, version=0))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created it first
+            db.session.rollback()
+
+
+def init_report_cache(app):
+    """Configure the cache from app config and invalidate it on attendance writes"""
+    report_cache.ttl = app.config.get("REPORT_CACHE_TTL", report_cache.ttl)
+    report_cache.max_bytes = app.config.get("REPORT_CACHE_MAX_BYTES", report_cache.max_bytes)
+    with app.app_context():
+        for engine in db.engines.values():
+            _track_writes(engine)
+    # Session writes from any process bump ReportVersion in their own transaction
+    if not event.contains(Session, "before_commit", _bump_version):
+        event.listen(Session, "after_flush", _mark_flush)
+        event.listen(Session, "do_orm_execute", _mark_statement)
+        event.listen(Session, "before_commit", _bump_version)
+        event.listen(Session, "after_rollback", _forget_writes)
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import sqlalchemy as sa
+from flask_sqlalchemy.session import Session
+
+# Tables whose rows live on the tenant's shard; everything else stays on the
+# primary database (users, locations, shard map, ...)
+SHARDED_TABLES = {'checkin_checkout', 'geo_location'}
+
+# The primary database doubles as the first attendance shard
+DEFAULT_SHARD = 'default'
+
+_current_shard = ContextVar('current_shard', default=DEFAULT_SHARD)
+
+
+def current_shard():
+    """Name of the shard attendance queries are routed to in this context"""
+    return _current_shard.get()
+
+
+def record_key(record_id, shard=None):
+    """Key for an attendance row that is unique across shards: "<shard>:<id>".
+
+    Row ids are only unique within a shard, so payloads mixing shards need
+    this instead. ``shard`` defaults to the current one. Both change when
+    a tenant is moved (see sharding.move_tenant).
+    """
+    return f"{shard or _current_shard.get()}:{record_id}"
+
+
+def activate_shard(name):
+    """Route attendance tables to shard ``name``; returns a token for deactivate_shard"""
+    return _current_shard.set(name)
+
+
+def deactivate_shard(token):
+    _current_shard.reset(token)
+
+
+@contextmanager
+def use_shard(name):
+    """Route attendance tables to shard ``name`` for the duration of the block.
+
+    Flush and commit inside the block: pending attendance rows are written
+    to whichever shard is current when the session flushes.
+    """
+    token = activate_shard(name)
+    try:
+        yield name
+    finally:
+        deactivate_shard(token)
+
+
+def _table_for(mapper, clause):
+    if mapper is not None:
+        return sa.inspect(mapper).local_table
+    if isinstance(clause, sa.Table):
+        return clause
+    if isinstance(clause, sa.UpdateBase) and isinstance(clause.table, sa.Table):
+        return clause.table
+    return None
+
+
+class ShardRoutingSession(Session):
+    """Session that sends attendance tables to the current shard's engine.
+
+    Shards are configured as ``SQLALCHEMY_BINDS`` entries; with no shard
+    selected (or the default one) this behaves exactly like the stock
+    Flask-SQLAlchemy session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = current_shard()
+        if bind is None and shard != DEFAULT_SHARD:
+            table = _table_for(mapper, clause)
+            if table is not None and table.name in SHARDED_TABLES:
+                return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
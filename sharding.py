@@ -0,0 +1,268 @@
+import heapq
+import logging
+
+from flask import current_app
+from sqlalchemy import MetaData, ForeignKeyConstraint, func, insert, select, delete, update
+from sqlalchemy.exc import IntegrityError
+
+from database import write_intent
+from models import db, User, ShardAssignment
+from shard_routing import SHARDED_TABLES, DEFAULT_SHARD, use_shard
+
+logger = logging.getLogger(__name__)
+
+# Rows copied per statement when moving a tenant between shards
+REBALANCE_BATCH_SIZE = 1000
+
+
+class ShardUnavailable(Exception):
+    """Raised when writing for a tenant that is being moved between shards"""
+
+
+def shard_names():
+    """All attendance shards, the primary database first"""
+    return current_app.config.get("ATTENDANCE_SHARDS", [DEFAULT_SHARD])
+
+
+def sharding_enabled():
+    return len(shard_names()) > 1
+
+
+def tenant_for_email(email):
+    """Organisation key for a user: the domain of their email address"""
+    return email.rsplit('@', 1)[-1].lower() if email else ''
+
+
+def _assign_tenant(tenant):
+    """Place a tenant seen for the first time on the shard with the fewest tenants"""
+    counts = dict(
+        db.session.query(ShardAssignment.shard, func.count()).group_by(ShardAssignment.shard).all()
+    )
+    shard = min(shard_names(), key=lambda name: counts.get(name, 0))
+    try:
+        db.session.add(ShardAssignment(tenant=tenant, shard=shard))
+        db.session.commit()
+        logger.info(f"Assigned tenant {tenant} to shard {shard}")
+    except IntegrityError:
+        # Another worker assigned it first
+        db.session.rollback()
+    return db.session.get(ShardAssignment, tenant)
+
+
+def shard_for_user(user_id, for_write=False):
+    """Name of the shard holding ``user_id``'s attendance rows"""
+    if not sharding_enabled():
+        return DEFAULT_SHARD
+
+    email = db.session.query(User.email).filter_by(id=user_id).scalar()
+    tenant = tenant_for_email(email)
+    assignment = db.session.get(ShardAssignment, tenant) or _assign_tenant(tenant)
+
+    if for_write and assignment.read_only:
+        raise ShardUnavailable(f"Attendance for {tenant} is being moved; try again shortly")
+    return assignment.shard
+
+
+def user_shard(user_id, for_write=False):
+    """Context manager routing attendance queries to ``user_id``'s shard"""
+    return use_shard(shard_for_user(user_id, for_write=for_write))
+
+
+def _expunge_sharded():
+    # Primary keys are only unique within a shard, so drop attendance rows from
+    # the identity map before loading the same ids from the next shard
+    for obj in list(db.session.identity_map.values()):
+        if obj.__table__.name in SHARDED_TABLES:
+            db.session.expunge(obj)
+
+
+def scatter_gather(fn):
+    """Call ``fn()`` once per shard and return the list of results.
+
+    ``fn`` should serialise what it needs before returning; ORM attendance
+    objects are detached between shards.
+    """
+    results = []
+    for name in shard_names():
+        with use_shard(name):
+            results.append(fn())
+        if sharding_enabled():
+            _expunge_sharded()
+    return results
+
+
+def merge_sorted(results, key, reverse=False):
+    """Merge per-shard lists that are each already sorted by ``key``"""
+    if len(results) == 1:
+        return list(results[0])
+    return list(heapq.merge(*results, key=key, reverse=reverse))
+
+
+def shard_metadata():
+    """Attendance tables as created on a shard: no foreign keys to primary-only tables"""
+    metadata = MetaData()
+    for name in SHARDED_TABLES:
+        table = db.metadata.tables[name]
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.constraints):
+            if not isinstance(constraint, ForeignKeyConstraint):
+                continue
+            referred_table = constraint.elements[0].target_fullname.split('.')[0]
+            if referred_table not in SHARDED_TABLES:
+                copy.constraints.remove(constraint)
+                for column in constraint.columns:
+                    column.foreign_keys.difference_update(constraint.elements)
+                copy.foreign_keys.difference_update(constraint.elements)
+    return metadata
+
+
+def _shard_engine(name):
+    return db.engine if name == DEFAULT_SHARD else db.engines[name]
+
+
+def create_shard_tables():
+    """Create the attendance tables on every configured shard"""
+    metadata = shard_metadata()
+    for name in shard_names():
+        if name != DEFAULT_SHARD:
+            metadata.create_all(_shard_engine(name))
+
+
+def _sync_tenant_rows(src, dst, user_ids, copied, lock=False):
+    """Copy ``user_ids``' attendance rows from ``src`` that ``copied`` lacks or has stale.
+
+    ``copied`` maps source row ids to ``(target id, updated_at)`` as of their
+    last copy and is updated in place. With ``lock`` the source rows are
+    locked (FOR UPDATE) until ``src``'s transaction ends. Returns the number
+    of rows written to ``dst``.
+    """
+    checkins = db.metadata.tables['checkin_checkout']
+    geo = db.metadata.tables['geo_location']
+    written = 0
+    last_id = 0
+
+    while True:
+        query = (
+            select(checkins)
+            .where(checkins.c.user_id.in_(user_ids), checkins.c.id > last_id)
+            .order_by(checkins.c.id)
+            .limit(REBALANCE_BATCH_SIZE)
+        )
+        rows = src.execute(query.with_for_update() if lock else query).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+
+        new = [row for row in rows if row['id'] not in copied]
+        changed = [row for row in rows if row['id'] in copied and copied[row['id']][1] != row['updated_at']]
+
+        if new:
+            # Ids are only unique per shard, so the target assigns new ones
+            inserted = dst.execute(
+                insert(checkins).returning(checkins.c.id, sort_by_parameter_order=True),
+                [{k: v for k, v in row.items() if k != 'id'} for row in new]
+            ).scalars().all()
+            for row, target_id in zip(new, inserted):
+                copied[row['id']] = (target_id, row['updated_at'])
+
+            geo_rows = src.execute(
+                select(geo).where(geo.c.checkin_id.in_([row['id'] for row in new]))
+            ).mappings().all()
+            if geo_rows:
+                dst.execute(insert(geo), [
+                    {**{k: v for k, v in row.items() if k != 'id'}, 'checkin_id': copied[row['checkin_id']][0]}
+                    for row in geo_rows
+                ])
+
+        for row in changed:
+            target_id = copied[row['id']][0]
+            dst.execute(
+                update(checkins).where(checkins.c.id == target_id)
+                .values({k: v for k, v in row.items() if k != 'id'})
+            )
+            copied[row['id']] = (target_id, row['updated_at'])
+
+        written += len(new) + len(changed)
+
+    return written
+
+
+def _delete_copied_rows(conn, source_ids):
+    """Delete the given attendance rows (and their legacy geo rows) from a shard"""
+    checkins = db.metadata.tables['checkin_checkout']
+    geo = db.metadata.tables['geo_location']
+    source_ids = list(source_ids)
+    for start in range(0, len(source_ids), REBALANCE_BATCH_SIZE):
+        batch = source_ids[start:start + REBALANCE_BATCH_SIZE]
+        conn.execute(delete(geo).where(geo.c.checkin_id.in_(batch)))
+        conn.execute(delete(checkins).where(checkins.c.id.in_(batch)))
+
+
+def move_tenant(tenant, target):
+    """Move all attendance rows of ``tenant`` to shard ``target``.
+
+    The tenant is marked read-only while rows are copied, so new check-ins
+    and check-outs are rejected until the shard map points at the target.
+    A write that passed the read-only check just before it was set can
+    still commit to the source during the copy. So after the switch the
+    source rows are locked and re-read: rows added or changed since their
+    copy are copied again, and only rows known to be on the target are
+    deleted from the source.
+
+    Moved rows get new ids (and keys, see ``record_key``) on the target.
+    History clients holding a sync token from before the move get a 410
+    and must resync in full.
+    """
+    if target not in shard_names():
+        raise ValueError(f"Unknown shard: {target}")
+
+    with write_intent():
+        assignment = db.session.get(ShardAssignment, tenant) or _assign_tenant(tenant)
+        source = assignment.shard
+        if source == target:
+            return 0
+
+        user_ids = [
+            user_id for user_id, email in db.session.query(User.id, User.email).all()
+            if tenant_for_email(email) == tenant
+        ]
+
+        assignment.read_only = True
+        db.session.commit()
+
+    copied = {}
+    try:
+        if user_ids:
+            # Only the target is written, so the source read is begun as a reader
+            with _shard_engine(source).begin() as src, write_intent():
+                with _shard_engine(target).begin() as dst:
+                    _sync_tenant_rows(src, dst, user_ids, copied)
+    except Exception:
+        # The copy runs in one target transaction, so nothing was written there
+        logger.exception(f"Moving tenant {tenant} to {target} failed; leaving it on {source}")
+        with write_intent():
+            assignment.read_only = False
+            db.session.commit()
+        raise
+
+    with write_intent():
+        assignment.shard = target
+        assignment.read_only = False
+        db.session.commit()
+
+    if user_ids:
+        checkins = db.metadata.tables['checkin_checkout']
+        # The target commits first: if it fails, nothing is deleted from the source
+        with write_intent(), _shard_engine(source).begin() as src, _shard_engine(target).begin() as dst:
+            late = _sync_tenant_rows(src, dst, user_ids, copied, lock=True)
+            _delete_copied_rows(src, copied)
+            left = src.execute(
+                select(func.count()).select_from(checkins).where(checkins.c.user_id.in_(user_ids))
+            ).scalar()
+        if late:
+            logger.info(f"Copied {late} rows of tenant {tenant} written on {source} during the move")
+        if left:
+            logger.warning(f"{left} rows of tenant {tenant} were written on {source} after the move "
+                           f"and were left there; run the move again to copy them")
+    logger.info(f"Moved tenant {tenant} ({len(copied)} rows) from {source} to {target}")
+    return len(copied)
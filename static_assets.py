@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
+from flask import Response, jsonify, request
+
+from compression import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Vite emits content-hashed file names under assets/, so they never change
+IMMUTABLE_PREFIX = 'assets/'
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json',
+                      'application/xml', 'image/svg+xml', 'application/manifest+json')
+MIN_COMPRESS_SIZE = 512
+PRECOMPRESSED_SUFFIXES = {'.br': 'br', '.gz': 'gzip'}
+
+
+class StaticAssets:
+    """In-memory manifest of the built frontend, loaded once at startup.
+
+    Every file under ``root`` is read into memory together with gzip/brotli
+    variants (taken from ``.gz``/``.br`` siblings when the build produced
+    them, otherwise compressed here), so serving a request never touches
+    the filesystem.
+    """
+
+    def __init__(self, root, index='index.html'):
+        self.root = root
+        self.index = index
+        self.files = {}
+        self.load()
+
+    def load(self):
+        self.files = {}
+        if not os.path.isdir(self.root):
+            logger.warning(f"Static asset directory {self.root} not found; frontend will not be served")
+            return
+
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if os.path.splitext(filename)[1] in PRECOMPRESSED_SUFFIXES:
+                    continue
+                full_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                self.files[rel_path] = self._load_file(full_path)
+
+        logger.info(f"Loaded {len(self.files)} static assets from {self.root}")
+
+    def _load_file(self, full_path):
+        with open(full_path, 'rb') as f:
+            body = f.read()
+
+        mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        variants = {None: body}
+
+        for suffix, encoding in PRECOMPRESSED_SUFFIXES.items():
+            if os.path.exists(full_path + suffix):
+                with open(full_path + suffix, 'rb') as f:
+                    variants[encoding] = f.read()
+
+        if len(body) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            if 'gzip' not in variants:
+                variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if 'br' not in variants and brotli is not None:
+                variants['br'] = brotli.compress(body)
+
+        # Keep only variants that are actually smaller than the original
+        variants = {enc: data for enc, data in variants.items()
+                    if enc is None or len(data) < len(body)}
+
+        return {
+            'mimetype': mimetype,
+            'etag': hashlib.sha1(body).hexdigest()[:20],
+            'variants': variants,
+        }
+
+    def _negotiate(self, variants):
+        accepted = accepted_encodings()
+        for encoding in ('br', 'gzip'):
+            if encoding in variants and accepted.get(encoding, 0) > 0:
+                return encoding
+        return None
+
+    def serve(self, path):
+        """Return a response for ``path``, falling back to the SPA index"""
+        if path not in self.files:
+            path = self.index
+        asset = self.files.get(path)
+        if asset is None:
+            return jsonify({"error": "Frontend not built"}), 404
+
+        encoding = self._negotiate(asset['variants'])
+        response = Response(asset['variants'][encoding], mimetype=asset['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if len(asset['variants']) > 1:
+            response.vary.add('Accept-Encoding')
+
+        response.set_etag(f"{asset['etag']}-{encoding}" if encoding else asset['etag'])
+        if path.startswith(IMMUTABLE_PREFIX):
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE
+        else:
+            response.headers['Cache-Control'] = REVALIDATE_CACHE
+
+        return response.make_conditional(request)
@@ -0,0 +1,75 @@
+import logging
+from datetime import date, datetime, time
+
+from sqlalchemy import case, select, update
+
+from models import db, CheckinCheckout
+from occupancy import reconcile_occupancy
+from sharding import scatter_gather
+
+logger = logging.getLogger(__name__)
+
+# Rows closed per UPDATE statement
+SWEEP_BATCH_SIZE = 500
+
+
+def _stale_days(cutoff):
+    """Days that still have open sessions past the cut-off"""
+    today = date.today()
+    query = db.session.query(CheckinCheckout.day).filter(
+        CheckinCheckout.checkout_time_stamp.is_(None),
+        CheckinCheckout.day <= today
+    ).distinct()
+    days = [day for (day,) in query.all()]
+    # Today's sessions are only stale once the cut-off time has passed
+    return sorted(day for day in days if day < today or datetime.now().time() >= cutoff)
+
+
+def _close_day(day, cutoff, batch_size):
+    closed = 0
+    closing_time = datetime.combine(day, cutoff)
+    while True:
+        batch = select(CheckinCheckout.id).where(
+            CheckinCheckout.day == day,
+            CheckinCheckout.checkout_time_stamp.is_(None)
+        ).limit(batch_size).scalar_subquery()
+
+        # Never check out before the check-in itself (late check-ins past the cut-off)
+        result = db.session.execute(
+            update(CheckinCheckout)
+            .where(CheckinCheckout.id.in_(batch), CheckinCheckout.checkout_time_stamp.is_(None))
+            .values(
+                checkout_time_stamp=case(
+                    (CheckinCheckout.checkin_time_stamp > closing_time, CheckinCheckout.checkin_time_stamp),
+                    else_=closing_time
+                ),
+                auto_closed=True
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        closed += result.rowcount
+        if result.rowcount < batch_size:
+            return closed
+
+
+def sweep_stale_sessions(cutoff, batch_size=SWEEP_BATCH_SIZE):
+    """Close sessions left open past ``cutoff`` (a time of day) on every shard.
+
+    Each batch is one set-based UPDATE that sets the check-out to the
+    cut-off on the session's own day and marks the row auto_closed.
+    Returns the number of sessions closed.
+    """
+    def sweep_shard():
+        return sum(_close_day(day, cutoff, batch_size) for day in _stale_days(cutoff))
+
+    closed = sum(scatter_gather(sweep_shard))
+    if closed:
+        logger.info(f"Auto-checkout closed {closed} forgotten session(s)")
+        reconcile_occupancy()
+    return closed
+
+
+def parse_cutoff(value):
+    """Parse an HH:MM cut-off time from configuration"""
+    return time.fromisoformat(value)